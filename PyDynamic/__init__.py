@@ -40,7 +40,11 @@ __all__ = [
     "AmpPhase2Time",
     "Time2AmpPhase",
     "FIRuncFilter",
+    "FIRuncFilterPlan",
+    "FIRuncFilterStream",
+    "FIRuncFilterCovariance",
     "IIRuncFilter",
+    "SOSuncFilter",
     "MC",
     "SMC",
     "UMC",
@@ -50,6 +54,7 @@ __all__ = [
     "grpdelay",
     "mapinside",
     "isstable",
+    "isstable_batch",
     "kaiser_lowpass",
     "savitzky_golay",
     "impinvar",
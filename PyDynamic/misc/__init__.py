@@ -12,6 +12,7 @@ __all__ = [
     "grpdelay",
     "mapinside",
     "isstable",
+    "isstable_batch",
     "kaiser_lowpass",
     "savitzky_golay",
     "impinvar",
@@ -39,6 +40,7 @@ from .filterstuff import (
     grpdelay,
     mapinside,
     isstable,
+    isstable_batch,
     kaiser_lowpass,
     savitzky_golay,
 )
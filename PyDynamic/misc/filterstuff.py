@@ -14,6 +14,8 @@ This module contains the following functions:
 * :func:`kaiser_lowpass`: Design of a FIR lowpass filter using the window technique
   with a Kaiser window.
 * :func:`isstable`: Determine whether a given IIR filter is stable
+* :func:`isstable_batch`: Determine for several IIR filters at once whether they
+  are stable
 * :func:`savitzky_golay`: Smooth (and optionally differentiate) data with a
   Savitzky-Golay filter
 
@@ -28,6 +30,7 @@ __all__ = [
     "mapinside",
     "kaiser_lowpass",
     "isstable",
+    "isstable_batch",
     "savitzky_golay",
 ]
 
@@ -172,6 +175,43 @@ def isstable(b, a, ftype="digital"):
         return not np.any(np.real(v) < 0)
 
 
+def isstable_batch(a, ftype="digital"):
+    """Determine for several IIR filters at once whether they are stable
+
+    Determine the stability of the IIR filters with the denominator coefficients
+    given by the rows of `a` as in :func:`isstable`, but from the eigenvalues of
+    the stacked companion matrices of all polynomials at once instead of one
+    call of :func:`numpy.roots` per filter.
+
+    Parameters
+    ----------
+        a: ndarray of shape (runs, Na + 1)
+            filter denominator coefficients, one filter per row
+        ftype: string
+            type of filter (`digital` or `analog`)
+    Returns
+    -------
+        stable: ndarray of shape (runs,)
+            whether the filters are stable or not
+    """
+    if ftype not in ("digital", "analog"):
+        raise ValueError(
+            f"isstable_batch: ftype is expected to be 'digital' or 'analog', but "
+            f"'{ftype}' is given."
+        )
+    a = np.atleast_2d(a)
+    Na = a.shape[1] - 1
+    if Na == 0:
+        return np.ones(len(a), dtype=bool)
+    companion = np.zeros((len(a), Na, Na), dtype=np.result_type(a, 1.0))
+    companion[:, 0, :] = -a[:, 1:] / a[:, :1]
+    companion[:, np.arange(1, Na), np.arange(Na - 1)] = 1.0
+    v = np.linalg.eigvals(companion)
+    if ftype == "digital":
+        return ~np.any(np.abs(v) > 1.0, axis=1)
+    return ~np.any(np.real(v) < 0, axis=1)
+
+
 def savitzky_golay(y, window_size, order, deriv=0, delta=1.0):
     """Smooth (and optionally differentiate) data with a Savitzky-Golay filter
 
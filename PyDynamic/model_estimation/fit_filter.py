@@ -27,7 +27,7 @@ import warnings
 import numpy as np
 import scipy.signal as dsp
 
-from ..misc.filterstuff import grpdelay, mapinside
+from ..misc.filterstuff import grpdelay, isstable_batch, mapinside
 
 __all__ = [
     "LSIIR",
@@ -591,7 +591,9 @@ def invLSIIR_unc(H, UH, Nb, Na, f, Fs, tau=0):
     Least-squares fit of a digital IIR filter to the reciprocal of a given set
     of frequency response values with given associated uncertainty.
     Propagation of uncertainties is
-    carried out using the Monte Carlo method.
+    carried out using the Monte Carlo method. Fitted filters which are not stable
+    are not considered for the mean and covariance, unless none of them is stable,
+    in which case all of them are. A RuntimeWarning is issued in both cases.
 
     Parameters
     ----------
@@ -648,6 +650,24 @@ def invLSIIR_unc(H, UH, Nb, Na, f, Fs, tau=0):
         bi, ai, Tau[k] = invLSIIR(HH[k, :], Nb, Na, f, Fs, tau, verbose=False)
         AB[k, :] = np.hstack((ai[1:], bi))
 
+    # screen all fitted filters for stability at once
+    stable = isstable_batch(np.hstack((np.ones((runs, 1)), AB[:, :Na])))
+    if not np.all(stable) and np.any(stable):
+        warnings.warn(
+            "%d of the %d fitted IIR filters are not stable and are not "
+            "considered for the calculation of the mean and covariance."
+            % (runs - np.count_nonzero(stable), runs),
+            RuntimeWarning,
+        )
+        AB, Tau = AB[stable], Tau[stable]
+    elif not np.any(stable):
+        warnings.warn(
+            "None of the %d fitted IIR filters is stable, the mean and covariance "
+            "are calculated from all of them. Maybe try again with a higher value "
+            "of tau or a higher filter order?" % runs,
+            RuntimeWarning,
+        )
+
     bi = np.mean(AB[:, Na:], axis=0)
     ai = np.hstack((np.array([1.0]), np.mean(AB[:, :Na], axis=0)))
     Uab = np.cov(AB, rowvar=False)
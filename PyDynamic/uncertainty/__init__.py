@@ -20,7 +20,14 @@ from .propagate_DFT import (
     Time2AmpPhase,
 )
 
-from .propagate_filter import FIRuncFilter, IIRuncFilter
+from .propagate_filter import (
+    FIRuncFilter,
+    FIRuncFilterPlan,
+    FIRuncFilterStream,
+    FIRuncFilterCovariance,
+    IIRuncFilter,
+    SOSuncFilter,
+)
 
 from .propagate_MonteCarlo import MC, SMC, UMC, UMC_generic
 
@@ -36,7 +43,11 @@ __all__ = [
     "AmpPhase2Time",
     "Time2AmpPhase",
     "FIRuncFilter",
+    "FIRuncFilterPlan",
+    "FIRuncFilterStream",
+    "FIRuncFilterCovariance",
     "IIRuncFilter",
+    "SOSuncFilter",
     "MC",
     "SMC",
     "UMC",
@@ -18,23 +18,37 @@ This module contains the following functions:
   requirements
 """
 
+import contextlib
 import functools
+import itertools
 import math
 import multiprocessing
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import scipy as sp
+import scipy.linalg
 import scipy.stats as stats
 from scipy.interpolate import interp1d
-from scipy.signal import lfilter
+from scipy.signal import lfilter, oaconvolve
 
-from ..misc.filterstuff import isstable
+from ..misc.filterstuff import isstable_batch
 from ..misc.tools import progress_bar
 from ..misc.noise import ARMA
 
 __all__ = ["MC", "SMC", "UMC", "UMC_generic"]
 
+# maximum number of array elements of intermediate results evaluated at once
+_MAX_BLOCK_ELEMENTS = 2 ** 22
+# default number of runs per block of SMC if the runs are drawn from seeded streams
+_SMC_BLOCKSIZE = 256
+# number of blocks the runs of MC are split into by default, independent of the
+# number of workers such that the random streams of the blocks do not depend on it
+_MC_BLOCKS = 16
+
 
 class Normal_ZeroCorr:
     """Multivariate normal distribution with zero correlation"""
@@ -85,16 +99,94 @@ class Normal_ZeroCorr:
                 "At least one of loc or scale must be of type " "numpy.ndarray."
             )
 
-    def rvs(self, size=1):
+    def rvs(self, size=1, random_state=None):
         # This function mimics the behavior of the scipy stats package
+        if random_state is None:
+            random_state = np.random.mtrand._rand  # global random state of numpy
         return np.tile(self.loc, (size, 1)) + \
-               np.random.randn(size, len(self.loc)) * \
+               random_state.standard_normal((size, len(self.loc))) * \
                np.tile(self.scale, (size, 1))
 
 
+class Normal_Correlated:
+    """Multivariate normal distribution with correlation
+
+    The covariance matrix is factorized once, such that blocks of draws only
+    require a matrix product. Draws for stationary (Toeplitz) covariance
+    matrices are generated by FFT from a circulant embedding, banded covariance
+    matrices are factorized by a banded Cholesky decomposition. Other covariance
+    matrices are factorized by a Cholesky decomposition or, if they are not
+    positive definite, by an eigendecomposition with negative eigenvalues set
+    to zero.
+    """
+
+    def __init__(self, loc, cov):
+        """
+        Parameters
+        ----------
+            loc: np.ndarray of shape (N,)
+                mean values
+            cov: np.ndarray of shape (N,N)
+                covariance matrix
+        """
+        self.loc = np.asarray(loc, dtype=float)
+        cov = 0.5 * (cov + cov.T)
+        N = len(self.loc)
+        self.method = None
+        if N > 2 and np.allclose(cov[1:, 1:], cov[:-1, :-1], rtol=1e-12, atol=0):
+            # eigenvalues of the circulant matrix of size 2(N-1) embedding cov
+            c = cov[0]
+            lambdas = np.real(np.fft.fft(np.hstack((c, c[-2:0:-1]))))
+            if np.min(lambdas) >= -1e-10 * np.max(np.abs(lambdas)):
+                self.method = "circulant"
+                self.factor = np.sqrt(np.clip(lambdas, 0, None) / len(lambdas))
+        if self.method is None:
+            bandwidth = N - 1
+            while bandwidth > 0 and not np.any(np.diagonal(cov, bandwidth)):
+                bandwidth -= 1
+            if 4 * (bandwidth + 1) <= N:
+                band = np.zeros((bandwidth + 1, N))
+                for d in range(bandwidth + 1):
+                    band[d, : N - d] = np.diagonal(cov, -d)
+                try:
+                    self.factor = sp.linalg.cholesky_banded(band, lower=True)
+                    self.method = "banded"
+                except np.linalg.LinAlgError:
+                    pass
+        if self.method is None:
+            self.method = "dense"
+            try:
+                self.factor = np.linalg.cholesky(cov)
+            except np.linalg.LinAlgError:
+                w, V = np.linalg.eigh(cov)
+                self.factor = V * np.sqrt(np.clip(w, 0, None))
+
+    def rvs(self, size=1, random_state=None):
+        # This function mimics the behavior of the scipy stats package
+        if random_state is None:
+            random_state = np.random.mtrand._rand  # global random state of numpy
+        N = len(self.loc)
+        if self.method == "circulant":
+            # real and imaginary part of each FFT are independent draws
+            shape = ((size + 1) // 2, len(self.factor))
+            Z = random_state.standard_normal(shape)
+            Z = Z + 1j * random_state.standard_normal(shape)
+            Y = np.fft.fft(self.factor * Z, axis=1)[:, :N]
+            return self.loc + np.vstack((Y.real, Y.imag))[:size]
+        Z = random_state.standard_normal((size, N))
+        if self.method == "banded":
+            Y = self.factor[0] * Z
+            for d in range(1, len(self.factor)):
+                Y[:, d:] += self.factor[d, : N - d] * Z[:, : N - d]
+            return self.loc + Y
+        return self.loc + Z.dot(self.factor.T)
+
+
 def MC(
         x, Ux, b, a, Uab, runs=1000, blow=None, alow=None,
-        return_samples=False, shift=0, verbose=True
+        return_samples=False, shift=0, verbose=True, blocksize=None,
+        covariance="full", n_workers=None, executor=None, seed=None,
+        adaptive=False, ndig=2, credible_interval=0.95
 ):
     r"""Standard Monte Carlo method
 
@@ -119,6 +211,39 @@ def MC(
             number of Monte Carlo runs
         return_samples: bool, optional
             whether samples or mean and std are returned
+        blocksize: int, optional
+            number of Monte Carlo runs drawn and filtered at once, defaults to
+            as many runs as fit into about 2**22 signal values, but at most
+            runs / 16, such that up to 16 workers get a block each. The default
+            does not depend on n_workers or the executor, such that for a given
+            seed the results are the same for any number of workers. In the
+            adaptive procedure, each
+            block is a set of trials and thus comprises at least
+            100 / (1 - credible_interval) runs (GUM-S1 7.9.4).
+        covariance: str or int, optional
+            which part of the covariance of the filter output signal to return,
+            "full" for the (N,N) matrix (default), "diag" for the (N,) variances
+            and an int k for the band (k+1,N) of the k upper diagonals, of which
+            row d holds the covariances of y[n] and y[n+d] (zero for n+d >= N)
+        n_workers: int, optional
+            number of processes the blocks of runs are distributed among
+        executor: concurrent.futures.Executor, optional
+            executor (or pool with a ``map`` method) the blocks of runs are
+            distributed among instead of processes set up by MC
+        seed: int, optional
+            seed of the random streams, for a given seed and blocksize the
+            results do not depend on n_workers or the executor. If neither seed, n_workers nor executor are given,
+            the random state of :mod:`numpy.random` is used.
+        adaptive: bool, optional
+            whether to stop as soon as the results have stabilized according to
+            the adaptive Monte Carlo procedure of GUM-S1 7.9, in which each block
+            of runs is one set of trials. runs is then the maximum number of runs.
+        ndig: int, optional
+            number of significant decimal digits of the standard uncertainties
+            required to have stabilized in the adaptive procedure
+        credible_interval: float, optional
+            coverage probability of the intervals, which are required to have
+            stabilized in the adaptive procedure
 
     If ``return_samples`` is ``False``, the method returns:
 
@@ -127,7 +252,7 @@ def MC(
         y: np.ndarray
             filter output signal
         Uy: np.ndarray
-            uncertainty associated with
+            uncertainty associated with y as requested by covariance
 
     Otherwise the method returns:
 
@@ -136,6 +261,15 @@ def MC(
         Y: np.ndarray
             array of Monte Carlo results
 
+    If ``adaptive`` is ``True``, the method additionally returns:
+
+    Returns
+    -------
+        report: dict
+            number of runs carried out ("runs"), numerical tolerance of the
+            standard uncertainties ("tolerance") and whether the results have
+            stabilized ("converged")
+
     References
     ----------
         * Eichstädt, Link, Harris and Elster [Eichst2012]_
@@ -143,63 +277,477 @@ def MC(
 
     Na = len(a)
     runs = int(runs)
+    if return_samples:
+        covariance = None  # the covariance is not accumulated then
+    else:
+        _MomentAccumulator(0, covariance)  # reject invalid choices before the MC runs
 
-    Y = np.zeros((runs, len(x)))   # set up matrix of MC results
-    theta = np.hstack((a[1:], b))  # create the parameter vector from the filter coefficients
-    Theta = np.random.multivariate_normal(theta, Uab, runs)  # Theta is small and thus we
-
-    # can draw the full matrix now.
     if isinstance(Ux, np.ndarray):
         if len(Ux.shape) == 1:
             dist = Normal_ZeroCorr(loc=x, scale=Ux)  # non-iid noise w/o correlation
         else:
-            dist = stats.multivariate_normal(x, Ux)  # colored noise
+            dist = Normal_Correlated(x, Ux)  # colored noise
     elif isinstance(Ux, float):
         dist = Normal_ZeroCorr(loc=x, scale=Ux)  # iid noise
     else:
         raise NotImplementedError("The supplied type of uncertainty is not implemented")
 
-    unst_count = 0  # Count how often in the MC runs the IIR filter is unstable.
-    st_inds = list()
+    if blocksize is None:
+        blocksize = max(1, _MAX_BLOCK_ELEMENTS // len(x))
+        blocksize = min(blocksize, max(1, math.ceil(runs / _MC_BLOCKS)))
+        if adaptive:
+            blocksize = max(blocksize, _min_set_size(credible_interval))
+    if adaptive:
+        set_size = _min_set_size(credible_interval)
+        if blocksize < set_size or runs < set_size:
+            raise ValueError(
+                "MC: the adaptive procedure requires sets of at least %d runs for "
+                "a credible interval of %g (GUM-S1 7.9.4), but got blocksize=%d and "
+                "runs=%d." % (set_size, credible_interval, blocksize, runs)
+            )
+    if alow is None:
+        alow = 1.0  # FIR low-pass filter
+    theta = np.hstack((a[1:], b))  # create the parameter vector from the filter coefficients
+    starts = range(0, runs, blocksize)
+    block_runs = [min(blocksize, runs - start) for start in starts]
+
+    if seed is None and n_workers is None and executor is None:
+        # all runs draw from the global random state of numpy
+        random_states = [np.random.mtrand._rand] * len(starts)
+        # Theta is small and thus we can draw the full matrix now
+        Theta = np.random.multivariate_normal(theta, Uab, runs)
+        Thetas = [Theta[start : start + n] for start, n in zip(starts, block_runs)]
+    else:
+        # each block of runs draws from its own random stream
+        random_states = _spawn_generators(seed, len(starts))
+        Thetas = [None] * len(starts)
+
+    block = functools.partial(
+        _MCblock, theta=theta, Uab=Uab, Na=Na, dist=dist, blow=blow, alow=alow,
+        shift=shift, covariance=covariance,
+        credible_interval=credible_interval if adaptive else None,
+    )
+    blocks = _map_blocks(
+        block, zip(block_runs, Thetas, random_states), n_workers, executor,
+        lazy=adaptive,
+    )
+
+    if return_samples:
+        Y = np.zeros((runs, len(x)))
+    else:
+        moments = _MomentAccumulator(len(x), covariance)
+    if adaptive:
+        stopping = _AdaptiveStopping(len(x), ndig, credible_interval)
+    stable_count = 0
+    stop = 0
     if verbose:
         sys.stdout.write("MC progress: ")
-    for k in range(runs):
-        xn = dist.rvs()  # draw filter input signal
-        if not blow is None:
-            if alow is None:
-                alow = 1.0  # FIR low-pass filter
-            xn = lfilter(blow, alow, xn)  # low-pass filtered input signal
-        bb = Theta[k, Na - 1 :]
-        aa = np.hstack((1.0, Theta[k, : Na - 1]))
-        if isstable(bb, aa):
-            Y[k, :] = lfilter(bb, aa, xn)
-            st_inds.append(k)
+    for start, n, (result, n_stable, estimates) in zip(starts, block_runs, blocks):
+        # the results are combined in the order of the blocks, such that they do
+        # not depend on how the blocks have been distributed among the workers
+        if return_samples:
+            Y[start : start + n] = result
         else:
-            unst_count += 1  # don't apply the IIR filter if it's unstable
-        if np.mod(k, 0.1 * runs) == 0 and verbose:
-            sys.stdout.write(" %d%%" % (np.round(100.0 * k / runs)))
+            moments.merge(result)
+        stable_count += n_stable
+        stop = start + n
+        if verbose and int(10 * start / runs) < int(10 * stop / runs):
+            sys.stdout.write(" %d%%" % (10 * int(10 * stop / runs)))
+        if adaptive:
+            if n == blocksize:  # a last, smaller block is no complete set
+                stopping.add(n_stable, estimates)
+            if stopping.converged:
+                break
+    blocks.close()
     if verbose:
-        sys.stdout.write(" 100%\n")
+        sys.stdout.write("\n")
+
+    unst_count = stop - stable_count  # how often the IIR filter is unstable
 
     if unst_count > 0:
-        print("In %d Monte Carlo %d filters have been unstable" % (runs, unst_count))
+        print("In %d Monte Carlo %d filters have been unstable" % (stop, unst_count))
         print("These results will not be considered for calculation of mean and " "std")
         print("However, if return_samples is 'True' then ALL samples are " "returned.")
 
-    Y = np.roll(Y, int(shift), axis=1)  # correct for the (known) sample delay
-
     if return_samples:
-        return Y
+        result = (Y[:stop],)
+    else:
+        result = (moments.mean, moments.cov())
+    if adaptive:
+        result += (stopping.report(stop),)
+    return result[0] if len(result) == 1 else result
+
+
+def _MCblock(
+        args, theta, Uab, Na, dist, blow, alow, shift, covariance,
+        credible_interval=None
+):
+    """Carry out a block of MC runs
+
+    Parameters
+    ----------
+        args: tuple
+            number of runs, their filter coefficients (or None to draw them) and
+            the random state to draw from
+        covariance: str, int or None
+            as for :func:`MC`, None to return the filter output signals instead
+            of their moments
+        credible_interval: float, optional
+            coverage probability of the intervals of the adaptive procedure
+
+    Returns
+    -------
+        result: _MomentAccumulator or np.ndarray
+            moments of the stable runs or the filter output signals of all runs
+        n_stable: int
+            number of runs with a stable filter
+        estimates: np.ndarray or None
+            estimates of the stable runs as of :func:`_set_estimates` if
+            credible_interval is given
+    """
+    n, Theta, random_state = args
+    if Theta is None:
+        Theta = random_state.multivariate_normal(theta, Uab, n)
+    # draw the filter input signals of the block of runs at once
+    Xn = np.reshape(dist.rvs(size=n, random_state=random_state), (n, -1))
+    if not blow is None:
+        Xn = lfilter(blow, alow, Xn, axis=1)  # low-pass filtered input signals
+    # don't apply the IIR filter if it's unstable
+    Yn, stable = _MCfilter(Theta, Na, Xn)
+    Yn = np.roll(Yn, int(shift), axis=1)  # correct for the (known) sample delay
+    estimates = None
+    if credible_interval is not None:
+        estimates = _set_estimates(Yn[stable], credible_interval)
+    if covariance is None:
+        return Yn, np.count_nonzero(stable), estimates
+    moments = _MomentAccumulator(Xn.shape[1], covariance)
+    moments.add(Yn[stable])
+    return moments, np.count_nonzero(stable), estimates
+
+
+def _spawn_generators(seed, n):
+    """Independent random generators for n blocks of Monte Carlo runs
+
+    The streams only depend on the seed and the index of the block, such that
+    results do not depend on which worker carries out which block.
+    """
+    return [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(n)]
+
+
+def _map_blocks(func, iterable, n_workers=None, executor=None, lazy=False):
+    """Apply func to the elements of iterable and yield the results in order
+
+    The elements are processed by ``executor.map``, if an executor is given, by a
+    pool of n_workers processes set up for this purpose, if n_workers > 1, and
+    one after the other in this process otherwise. If lazy, the elements are
+    handed to the workers in waves of one element per worker, such that not all
+    of them are processed if the caller stops early.
+    """
+    with _executor(n_workers, executor) as pool:
+        if pool is None:
+            yield from map(func, iterable)
+        else:
+            yield from _map_waves(pool, func, iterable, n_workers, lazy)
+
+
+@contextlib.contextmanager
+def _executor(n_workers=None, executor=None):
+    """The given executor or, if n_workers > 1, a pool of n_workers processes
+    set up for the duration of the context, otherwise None
+    """
+    if executor is None and n_workers is not None and n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            yield pool
     else:
-        y = np.mean(Y[st_inds, :], axis=0)
-        uy = np.cov(Y[st_inds, :], rowvar=False)
-        return y, uy
+        yield executor
+
+
+def _map_waves(executor, func, iterable, n_workers, lazy):
+    if not lazy:
+        yield from executor.map(func, iterable)
+        return
+    iterator = iter(iterable)
+    wave = n_workers or os.cpu_count() or 1
+    elements = list(itertools.islice(iterator, wave))
+    while elements:
+        yield from executor.map(func, elements)
+        elements = list(itertools.islice(iterator, wave))
+
+
+def _save_checkpoint(path, **data):
+    """Write the state of a Monte Carlo simulation to the npz file path
+
+    Arrays are stored as such and other objects, such as random generators, are
+    pickled. The file is replaced at once, such that an interrupted write does not
+    destroy the previous checkpoint.
+    """
+    arrays = {}
+    for key, value in data.items():
+        if not isinstance(value, np.ndarray):
+            array = np.empty((), dtype=object)
+            array[()] = value
+            value = array
+        arrays[key] = value
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def _load_checkpoint(path, **expected):
+    """Read the state of a Monte Carlo simulation written by
+    :func:`_save_checkpoint` and check that it belongs to the simulation with
+    the expected parameters
+    """
+    with np.load(path, allow_pickle=True) as data:
+        checkpoint = {
+            key: value[()] if value.dtype == object and value.ndim == 0 else value
+            for key, value in data.items()
+        }
+    for key, value in expected.items():
+        if checkpoint.get(key) != value:
+            raise ValueError(
+                f"The checkpoint {path} has been written with {key} = "
+                f"{checkpoint.get(key)}, but {key} = {value} is given."
+            )
+    return checkpoint
+
+
+class _MomentAccumulator:
+    """Mean and covariance of samples which are added block by block
+
+    The mean and the sums of squared deviations from the mean of each block are
+    merged with the ones of the previous blocks by the pairwise update of Chan,
+    Golub and LeVeque, such that the memory requirement does not depend on the
+    number of samples.
+
+    Parameters
+    ----------
+        N: int
+            length of a sample
+        covariance: str or int, optional
+            "full" for the (N,N) covariance (default), "diag" for the (N,)
+            variances and an int k for the (k+1,N) band of the k upper diagonals
+    """
+
+    def __init__(self, N, covariance="full"):
+        if covariance == "full":
+            shape = (N, N)
+        elif covariance == "diag":
+            shape = (N,)
+        elif isinstance(covariance, (int, np.integer)) and covariance >= 0:
+            shape = (covariance + 1, N)
+        else:
+            raise ValueError(
+                f"covariance is expected to be 'full', 'diag' or a non-negative "
+                f"int, but {covariance} is given."
+            )
+        self.covariance = covariance
+        self.n = 0
+        self.mean = np.zeros(N)
+        self.M2 = np.zeros(shape)  # sums of products of deviations from the mean
+
+    def add(self, Y):
+        """Add the samples given by the rows of Y"""
+        if len(Y) > 0:
+            mean = np.mean(Y, axis=0)
+            self._merge(len(Y), mean, self._products(Y - mean))
+
+    def merge(self, other):
+        """Add the samples accumulated by another accumulator"""
+        if other.n > 0:
+            self._merge(other.n, other.mean, other.M2)
+
+    def cov(self):
+        """Sample covariance (normalized by n - 1) in the requested form"""
+        return self.M2 / (self.n - 1)
+
+    def _merge(self, n, mean, M2):
+        delta = mean - self.mean
+        n_total = self.n + n
+        self.M2 += M2 + self._products(delta[np.newaxis, :]) * self.n * n / n_total
+        self.mean += delta * n / n_total
+        self.n = n_total
+
+    def _products(self, D):
+        """Sums over the rows of D of the products required for M2"""
+        if self.covariance == "full":
+            return D.T.dot(D)
+        if self.covariance == "diag":
+            return np.sum(D ** 2, axis=0)
+        N = D.shape[1]
+        band = np.zeros(self.M2.shape)
+        for d in range(min(len(band), N)):
+            band[d, : N - d] = np.sum(D[:, : N - d] * D[:, d:], axis=0)
+        return band
+
+
+class _AdaptiveStopping:
+    """Stabilization check of the adaptive Monte Carlo procedure of GUM-S1
+
+    Following GUM-S1 7.9, the runs are divided into sets of Monte Carlo trials,
+    each of which comprises at least ``100 / (1 - credible_interval)`` runs
+    (GUM-S1 7.9.4). Sets are either added as a whole by :meth:`add` or pooled
+    from consecutive blocks of runs by :meth:`add_runs`. The results are stabilized, once twice the standard deviation of the
+    averages over the sets of the estimates, standard uncertainties and endpoints
+    of the credible intervals obtained from each set are within the numerical
+    tolerance of the standard uncertainties obtained from all sets.
+
+    Parameters
+    ----------
+        N: int
+            length of the Monte Carlo results
+        ndig: int, optional
+            number of significant decimal digits of the standard uncertainties
+            the numerical tolerance refers to
+        credible_interval: float, optional
+            coverage probability of the probabilistically symmetric intervals
+    """
+
+    def __init__(self, N, ndig=2, credible_interval=0.95):
+        self.ndig = ndig
+        self.credible_interval = credible_interval
+        self.moments = _MomentAccumulator(N, "diag")  # of all runs
+        self.sets = _MomentAccumulator(4 * N, "diag")  # of the estimates of the sets
+        self.set_size = _min_set_size(credible_interval)
+        self._pending = []  # blocks of runs of the current set
+
+    def add(self, n, estimates):
+        """Add the estimates of a set of n runs as of :func:`_set_estimates`"""
+        if n > 1:  # a standard uncertainty requires at least two runs
+            self.moments._merge(n, estimates[0], estimates[1] ** 2 * (n - 1))
+            self.sets.add(np.reshape(estimates, (1, -1)))
+
+    def add_runs(self, Y):
+        """Pool the block of runs Y into the current set, which is added once full"""
+        self._pending.append(Y)
+        if sum(len(block) for block in self._pending) >= self.set_size:
+            Y = np.concatenate(self._pending)
+            self._pending = []
+            self.add(len(Y), _set_estimates(Y, self.credible_interval))
+
+    @property
+    def tolerance(self):
+        """Numerical tolerance of the standard uncertainties (GUM-S1 7.9.2)"""
+        with np.errstate(divide="ignore"):
+            exponent = np.floor(np.log10(np.sqrt(self.moments.cov())))
+        return 0.5 * 10.0 ** (exponent - self.ndig + 1)
+
+    @property
+    def converged(self):
+        """Whether the results have stabilized"""
+        if self.sets.n < 2:
+            return False
+        s = np.sqrt(self.sets.cov() / self.sets.n)
+        return bool(np.all(2 * s <= np.tile(self.tolerance, 4)))
+
+    def report(self, runs):
+        """Summary of the adaptive procedure after the given number of runs"""
+        return {
+            "runs": runs,
+            "tolerance": self.tolerance,
+            "converged": self.converged,
+        }
+
+
+def _min_set_size(credible_interval):
+    """Minimum number of trials of a set of the adaptive procedure (GUM-S1 7.9.4)"""
+    return math.ceil(100 / (1 - credible_interval) - 1e-9)
+
+
+def _set_estimates(Y, credible_interval):
+    """Estimates, standard uncertainties and credible intervals of a set of runs
+
+    Returns
+    -------
+        estimates: np.ndarray of shape (4, N)
+            mean, standard deviation and the lower and upper endpoint of the
+            probabilistically symmetric credible interval of the rows of Y
+    """
+    if len(Y) < 2:
+        return np.full((4, Y.shape[1]), np.nan)
+    low, high = np.quantile(
+        Y, [(1 - credible_interval) / 2, (1 + credible_interval) / 2], axis=0
+    )
+    return np.vstack((np.mean(Y, axis=0), np.std(Y, axis=0, ddof=1), low, high))
+
+
+def _quantiles(Y, prob, alphap=0.4, betap=0.4):
+    """Quantiles of the columns of Y as of :func:`scipy.stats.mstats.mquantiles`
+
+    The order statistics required for the quantiles are the same for all
+    columns, such that they are selected for all columns at once by a partial
+    sort instead of sorting each column.
+
+    Returns
+    -------
+        Q: np.ndarray of shape (len(prob), Y.shape[1])
+            quantiles of the columns of Y
+    """
+    n = len(Y)
+    p = np.atleast_1d(prob).astype(float)
+    if n == 1:
+        return np.tile(Y, (len(p), 1))
+    aleph = n * p + alphap + p * (1.0 - alphap - betap)
+    k = np.floor(aleph.clip(1, n - 1)).astype(int)
+    gamma = (aleph - k).clip(0, 1)[:, np.newaxis]
+    Y = np.partition(Y, np.unique(np.hstack((k - 1, k))), axis=0)
+    return (1.0 - gamma) * Y[k - 1] + gamma * Y[k]
+
+
+def _MCfilter(Theta, Na, Xn):
+    """Apply the filters given by the rows of Theta to the rows of Xn
+
+    Runs sharing the same filter coefficients are filtered at once, FIR filters
+    with different coefficients are applied by FFT-based convolution.
+
+    Parameters
+    ----------
+        Theta: np.ndarray of shape (runs, Na - 1 + Nb)
+            filter coefficients (a[1:], b) of each run
+        Na: int
+            number of denominator coefficients including a[0]
+        Xn: np.ndarray of shape (runs, N)
+            filter input signals
+
+    Returns
+    -------
+        Y: np.ndarray of shape (runs, N)
+            filter output signals, zero for unstable filters
+        stable: np.ndarray of shape (runs,)
+            whether the filter of a run is stable
+    """
+    Y = np.zeros_like(Xn)
+    stable = np.ones(len(Theta), dtype=bool)
+    unique_Theta, inverse = np.unique(Theta, axis=0, return_inverse=True)
+
+    if Na == 1 and len(unique_Theta) > 1:
+        # FIR filters are always stable
+        Y[:] = oaconvolve(Xn, Theta, mode="full", axes=1)[:, : Xn.shape[1]]
+        return Y, stable
+
+    # screen all filters for stability at once
+    unique_stable = isstable_batch(
+        np.hstack((np.ones((len(unique_Theta), 1)), unique_Theta[:, : Na - 1]))
+    )
+    stable = unique_stable[inverse]
+    # indices of the runs sharing the same filter coefficients
+    order = np.argsort(inverse, kind="stable")
+    groups = np.split(order, np.flatnonzero(np.diff(inverse[order])) + 1)
+    for theta, runs, is_stable in zip(unique_Theta, groups, unique_stable):
+        if is_stable:
+            bb = theta[Na - 1 :]
+            aa = np.hstack((1.0, theta[: Na - 1]))
+            Y[runs] = lfilter(bb, aa, Xn[runs], axis=1)
+
+    return Y, stable
 
 
 def SMC(
         x, noise_std, b, a, Uab=None, runs=1000, Perc=None, blow=None,
         alow=None, shift=0, return_samples=False, phi=None, theta=None,
-        Delta=0.0
+        Delta=0.0, blocksize=None, n_workers=None, executor=None, seed=None,
+        checkpoint=None, checkpoint_interval=600.0, resume_from=None
 ):
     r"""Sequential Monte Carlo method
 
@@ -237,6 +785,31 @@ def SMC(
             \theta_k w(n-k) + w(n)` with :math:`w(n)\sim N(0,noise_std^2)`
         Delta: float,optional
              upper bound on systematic error of the filter
+        blocksize: int, optional
+            number of runs simulated together, by default all runs or, if any
+            of seed, n_workers or executor is given, blocks of up to 256 runs
+        n_workers: int, optional
+            number of processes the blocks of runs are distributed among
+        executor: concurrent.futures.Executor, optional
+            executor (or pool with a ``map`` method) the blocks of runs are
+            distributed among instead of processes set up by SMC
+        seed: int, optional
+            seed of the random streams, for a given seed and blocksize the
+            results do not depend on n_workers or the executor. If neither seed,
+            n_workers nor executor are given, the random state of
+            :mod:`numpy.random` is used.
+        checkpoint: str, optional
+            path of a file the state of the simulation is saved to in npz format
+            after a window of samples, if at least checkpoint_interval seconds
+            have passed since the last checkpoint
+        checkpoint_interval: float, optional
+            minimum time in seconds between two checkpoints, default 600
+        resume_from: str, optional
+            path of a checkpoint to resume an interrupted simulation from. The
+            other parameters have to be the same as for the interrupted one, the
+            results are then identical to those of an uninterrupted simulation.
+            As checkpoints contain pickled objects, only resume from trusted
+            files.
 
     If ``return_samples`` is ``False``, the method returns:
 
@@ -262,149 +835,237 @@ def SMC(
     """
 
     runs = int(runs)
+    a = np.atleast_1d(a)
+    b = np.atleast_1d(b)
+    Na = len(a) - 1  # filter order denominator
+    if Na == 0:  # only FIR filter
+        coefs = b
+    else:
+        coefs = np.hstack((a[1:], b))
 
-    if isinstance(a, np.ndarray):  # filter order denominator
-        Na = len(a) - 1
+    global_random_state = seed is None and n_workers is None and executor is None
+    if blocksize is None:
+        blocksize = runs if global_random_state else min(runs, _SMC_BLOCKSIZE)
+    starts = range(0, runs, blocksize)
+    block_runs = [min(blocksize, runs - start) for start in starts]
+    if global_random_state:
+        # all runs draw from the global random state of numpy
+        random_states = [np.random.mtrand._rand] * len(starts)
     else:
-        Na = 0
-    if isinstance(b, np.ndarray):  # filter order numerator
-        Nb = len(b) - 1
+        # each block of runs draws from its own random stream
+        random_states = _spawn_generators(seed, len(starts))
+
+    step = functools.partial(
+        _SMCstep, Na=Na, noise_std=noise_std, blow=blow, alow=alow, phi=phi,
+        theta=theta, Delta=Delta,
+    )
+    window = max(1, _MAX_BLOCK_ELEMENTS // runs)
+
+    if resume_from is None:
+        # the states of the blocks of runs, which are simulated window by window
+        blocks = [
+            _SMCstate(n, coefs, Uab, Na, blow, alow, phi, theta, random_state)
+            for n, random_state in zip(block_runs, random_states)
+        ]
+        first = 0
+        y = np.zeros(len(x))
+        Uy = np.zeros(len(x))  # vector of uncorrelated point-wise uncertainties
+        if Perc is not None:  # percentiles requested
+            P = np.zeros((len(Perc), len(x)))
+        if return_samples:
+            Y = np.zeros((runs, len(x)))
     else:
-        Nb = 0
+        saved = _load_checkpoint(
+            resume_from, runs=runs, blocksize=blocksize, N=len(x),
+            Perc=None if Perc is None else list(Perc), return_samples=return_samples,
+        )
+        blocks, first, y, Uy = saved["blocks"], saved["start"], saved["y"], saved["Uy"]
+        if Perc is not None:
+            P = saved["P"]
+        if return_samples:
+            Y = saved["Y"]
+        if global_random_state:
+            np.random.set_state(saved["random_state"])
+            for state in blocks:
+                state["random_state"] = random_states[0]
+    last_checkpoint = time.monotonic()
 
-    # Initialize noise matrix corresponding to ARMA noise model.
-    if isinstance(theta, np.ndarray) or isinstance(theta, float):
-        MA = True
-        if isinstance(theta, float):
-            W = np.zeros((runs, 1))
-        else:
-            W = np.zeros((runs, len(theta)))
-    else:
-        MA = False  # no moving average part in noise process
+    # Start of the actual MC part.
+    print("Sequential Monte Carlo progress", end="")
+    # the processes are set up once for all windows
+    with _executor(n_workers, executor) as pool:
+        for start in range(first, len(x), window):
+            stop = min(start + window, len(x))
+            results = list(
+                _map_blocks(
+                    functools.partial(step, x=x[start:stop]), blocks, n_workers, pool
+                )
+            )
+            blocks = [state for _, state in results]
+            # the outputs of all runs in the window, in the order of the blocks such
+            # that they do not depend on how the blocks have been distributed
+            Yw = np.vstack([Yb for Yb, _ in results])
+
+            y[start:stop] = np.mean(Yw, axis=0)  # point-wise best estimate
+            Uy[start:stop] = np.std(Yw, axis=0)  # point-wise standard uncertainties
+            if Perc is not None:
+                P[:, start:stop] = _quantiles(Yw, Perc)
+            if return_samples:
+                Y[:, start:stop] = Yw
+
+            if int(10 * start / len(x)) < int(10 * stop / len(x)):
+                print(" %d%%" % (10 * int(10 * stop / len(x))), end="")
+
+            if (
+                checkpoint is not None and stop < len(x)
+                and time.monotonic() - last_checkpoint >= checkpoint_interval
+            ):
+                saved = dict(
+                    runs=runs, blocksize=blocksize, N=len(x),
+                    return_samples=return_samples,
+                    Perc=None if Perc is None else list(Perc), start=stop,
+                    blocks=blocks, y=y, Uy=Uy,
+                )
+                if Perc is not None:
+                    saved["P"] = P
+                if return_samples:
+                    saved["Y"] = Y
+                if global_random_state:
+                    saved["random_state"] = np.random.get_state()
+                _save_checkpoint(checkpoint, **saved)
+                last_checkpoint = time.monotonic()
+    print("")
 
-    # Initialize for autoregressive part of noise process.
-    if isinstance(phi, np.ndarray) or isinstance(phi, float):
-        AR = True
-        if isinstance(phi, float):
-            E = np.zeros((runs, 1))
-        else:
-            E = np.zeros((runs, len(phi)))
-    else:
-        AR = False  # No autoregressive part in noise process.
+    # Correct for (known) delay.
+    if return_samples:
+        return np.roll(Y, int(shift), axis=1)
+    y = np.roll(y, int(shift))
+    Uy = np.roll(Uy, int(shift))
 
-    # Initialize matrix of low-pass filtered input signal.
-    if isinstance(blow, np.ndarray):
-        X = np.zeros((runs, len(blow)))
+    if Perc is not None:
+        P = np.roll(P, int(shift), axis=1)
+        return y, Uy, P
     else:
-        X = np.zeros(runs)
+        return y, Uy
 
-    if isinstance(alow, np.ndarray):
-        Xl = np.zeros((runs, len(alow) - 1))
-    else:
-        Xl = np.zeros((runs, 1))
 
-    if Na == 0:  # only FIR filter
-        coefs = b
-    else:
-        coefs = np.hstack((a[1:], b))
+def _SMCstate(runs, coefs, Uab, Na, blow, alow, phi, theta, random_state):
+    """Initial state of a block of runs of :func:`SMC`
 
+    Returns
+    -------
+        state: dict
+            the random state, the filter coefficients of the runs, the states of
+            the noise process and the low-pass filter as of
+            :func:`scipy.signal.lfilter` and the past values of the direct form
+            II filter of each run, the most recent first
+    """
     if isinstance(Uab, np.ndarray):  # Monte Carlo draw for filter coefficients
-        Coefs = np.random.multivariate_normal(coefs, Uab, runs)
+        Coefs = random_state.multivariate_normal(coefs, Uab, runs)
     else:
         Coefs = np.tile(coefs, (runs, 1))
+    Nb = Coefs.shape[1] - Na - 1  # filter order numerator
+    b_noise, a_noise = _SMCnoise_filter(phi, theta)
+    return {
+        "random_state": random_state,
+        "Coefs": Coefs,
+        "zi_noise": np.zeros((runs, max(len(a_noise), len(b_noise)) - 1)),
+        "zi_low": np.zeros(
+            (runs, max(len(blow), len(np.atleast_1d(alow))) - 1 if blow is not None
+             else 0)
+        ),
+        "States": np.zeros((runs, max(Na, Nb))),
+    }
 
-    b0 = Coefs[:, Na]
-
-    if Na > 0:  # filter is IIR
-        A = Coefs[:, :Na]
-        if Nb > Na:
-            A = np.hstack((A, np.zeros((runs, Nb - Na))))
-    else:  # filter is FIR -> zero state equations
-        A = np.zeros((runs, Nb))
 
-    # Fixed part of state-space model.
-    c = Coefs[:, Na + 1 :] - np.multiply(np.tile(b0[:, np.newaxis], (1, Nb)), A)
-    States = np.zeros(np.shape(A))  # initialise matrix of states
+def _SMCnoise_filter(phi, theta):
+    """Coefficients (b, a) of the ARMA filter shaping white noise into the noise
+    process of :func:`SMC`
+    """
+    b = np.hstack((1.0, np.atleast_1d(theta) if theta is not None else []))
+    a = np.hstack((1.0, -np.atleast_1d(phi) if phi is not None else []))
+    return b, a
 
-    calcP = False  # by default no percentiles requested
-    if Perc is not None:  # percentiles requested
-        calcP = True
-        P = np.zeros((len(Perc), len(x)))
 
-    # Initialize outputs.
-    y = np.zeros_like(x)
-    # Initialize vector of uncorrelated point-wise uncertainties.
-    Uy = np.zeros_like(x)
+def _SMCstep(state, x, Na, noise_std, blow, alow, phi, theta, Delta):
+    """Simulate a block of runs of :func:`SMC` for the samples x
 
-    # Start of the actual MC part.
-    print("Sequential Monte Carlo progress", end="")
+    The noise process and the low-pass filter are shared by all runs and applied
+    to the whole window of samples at once. The filter of each run is evaluated
+    in direct form II on a buffer holding its past values followed by the window.
 
-    for index in np.ndenumerate(x):
-
-        w = np.random.randn(runs) * noise_std  # noise process draw
-        if AR and MA:
-            E = np.hstack((E.dot(phi) + W.dot(theta) + w, E[:-1]))
-            W = np.hstack((w, W[:-1]))
-        elif AR:
-            E = np.hstack((E.dot(phi) + w, E[:-1]))
-        elif MA:
-            E = W.dot(theta) + w
-            W = np.hstack((w, W[:-1]))
+    Returns
+    -------
+        Y: np.ndarray of shape (runs, len(x))
+            filter output signals of the runs
+        state: dict
+            state of the block of runs after the last sample of x
+    """
+    state = dict(state)
+    random_state, Coefs, States = state["random_state"], state["Coefs"], state["States"]
+    runs, order = States.shape
+    L = len(x)
+
+    # noise process draws, sample by sample as the runs are simulated
+    w = random_state.standard_normal((L, runs)).T * noise_std
+    b_noise, a_noise = _SMCnoise_filter(phi, theta)
+    if len(b_noise) > 1 or len(a_noise) > 1:
+        e, state["zi_noise"] = lfilter(
+            b_noise, a_noise, w, axis=1, zi=state["zi_noise"]
+        )
+    else:
+        e = w
+    xl = x + e
+    if blow is not None:  # apply low-pass filter
+        aa = np.atleast_1d(alow) if alow is not None else np.ones(1)
+        if state["zi_low"].shape[1] > 0:
+            xl, state["zi_low"] = lfilter(blow, aa, xl, axis=1, zi=state["zi_low"])
         else:
-            w = np.random.randn(runs, 1) * noise_std
-            E = w
-
-        if isinstance(alow, np.ndarray):  # apply low-pass filter
-            X = np.hstack((x[index] + E, X[:, :-1]))
-            Xl = np.hstack(
-                (X.dot(blow.T) - Xl[:, : len(alow)].dot(alow[1:]), Xl[:, :-1])
-            )
-        elif isinstance(blow, np.ndarray):
-            X = np.hstack((x[index] + E, X[:, :-1]))
-            Xl = X.dot(blow)
+            xl = lfilter(blow, aa, xl, axis=1)
+
+    # past values of the direct form II filters followed by those of the window
+    Z = np.zeros((runs, order + L))
+    Z[:, :order] = States[:, ::-1]
+    A = Coefs[:, :Na]
+    if Na == 0:
+        Z[:, order:] = xl
+    else:
+        unique_A, inverse = np.unique(A, axis=0, return_inverse=True)
+        if len(unique_A) <= L:
+            # runs sharing the same denominator are filtered at once, the
+            # initial conditions of the recursion from the past values of Z
+            zi = np.zeros((runs, Na))
+            for k in range(Na):
+                zi[:, k] = -np.sum(A[:, k:] * States[:, : Na - k], axis=1)
+            for group in range(len(unique_A)):
+                rows = np.flatnonzero(inverse == group)
+                Z[rows, order:] = lfilter(
+                    [1.0], np.hstack((1.0, unique_A[group])), xl[rows], axis=1,
+                    zi=zi[rows],
+                )[0]
         else:
-            Xl = x[index] + E
-
-        # Prepare for easier calculations.
-        if len(Xl.shape) == 1:
-            Xl = Xl[:, np.newaxis]
-
-        # State-space system output.
-        Y = (
-            np.sum(np.multiply(c, States), axis=1)
-            + np.multiply(b0, Xl[:, 0])
-            + (np.random.rand(runs) * 2 * Delta - Delta)
-        )
-        # Calculate state updates.
-        Z = -np.sum(np.multiply(A, States), axis=1) + Xl[:, 0]
-        # Store state updates and remove old ones.
-        States = np.hstack((Z[:, np.newaxis], States[:, :-1]))
-
-        y[index] = np.mean(Y)  # point-wise best estimate
-        Uy[index] = np.std(Y)  # point-wise standard uncertainties
-        if calcP:
-            P[:, index] = sp.stats.mstats.mquantiles(np.asarray(Y), prob=Perc)
+            for n in range(L):
+                Z[:, order + n] = xl[:, n] - np.sum(
+                    A * Z[:, order + n - Na : order + n][:, ::-1], axis=1
+                )
 
-        if np.mod(index, np.round(0.1 * len(x))) == 0:
-            print(" %d%%" % (np.round(100.0 * index / len(x))), end="")
+    # State-space system output.
+    B = Coefs[:, Na:]
+    Y = np.zeros((runs, L))
+    for k in range(B.shape[1]):
+        Y += B[:, k, np.newaxis] * Z[:, order - k : order - k + L]
+    if Delta > 0:
+        Y += random_state.uniform(-Delta, Delta, (L, runs)).T
 
-    print(" 100%")
-
-    # Correct for (known) delay.
-    y = np.roll(y, int(shift))
-    Uy = np.roll(Uy, int(shift))
-
-    if calcP:
-        P = np.roll(P, int(shift), axis=1)
-        return y, Uy, P
-    else:
-        return y, Uy
+    state["States"] = Z[:, L:][:, ::-1]
+    return Y, state
 
 
 def UMC(
         x, b, a, Uab, runs=1000, blocksize=8, blow=1.0, alow=1.0, phi=0.0,
         theta=0.0, sigma=1, Delta=0.0, runs_init=100, nbins=1000,
-        credible_interval=0.95
+        credible_interval=0.95, adaptive=False, ndig=2, checkpoint=None,
+        checkpoint_interval=600.0, resume_from=None, n_cpu=None, executor=None
 ):
     """
     Batch Monte Carlo for filtering using update formulae for mean, variance and (approximated) histogram.
@@ -443,6 +1104,19 @@ def UMC(
         credible_interval: float, optional
             must be in [0,1]
             central credible interval size
+        adaptive: bool, optional
+            whether to stop as soon as the results have stabilized according to
+            the adaptive Monte Carlo procedure of GUM-S1 7.9, see
+            :func:`UMC_generic`. runs is then the maximum number of runs.
+        ndig: int, optional
+            number of significant decimal digits of the standard uncertainties
+            required to have stabilized in the adaptive procedure
+        checkpoint, checkpoint_interval, resume_from: optional
+            periodic checkpoints of the simulation and resumption of an
+            interrupted one, see :func:`UMC_generic`
+        n_cpu, executor: optional
+            number of processes or executor the runs are evaluated by, see
+            :func:`UMC_generic`
 
     By default, phi, theta, sigma are chosen such, that N(0,1)-noise is added to the input signal.
 
@@ -459,6 +1133,8 @@ def UMC(
         happr: dict
             dictionary keys: given nbin
             dictionary values: bin-edges val["bin-edges"], bin-counts val["bin-counts"]
+        report: dict
+            only if adaptive, see :func:`UMC_generic`
 
     References
     ----------
@@ -483,7 +1159,8 @@ def UMC(
 
     # variate the coefficients of filter as main simulation influence
     ab = np.hstack((a[1:], b))    # create the parameter vector from the filter coefficients (should be named theta, but this name is already used)
-    draw_samples = lambda size: np.random.multivariate_normal(ab, Uab, size)
+    # only stable filters are considered, as in MC
+    draw_samples = functools.partial(_UMCdraw, ab=ab, Uab=Uab, Na=len(a))
 
     # how to evaluate functions
     params = {
@@ -499,7 +1176,12 @@ def UMC(
     evaluate = functools.partial(_UMCevaluate, **params)
 
     # run UMC
-    y, Uy, happr, _ = UMC_generic(draw_samples, evaluate, runs=runs, blocksize=blocksize, runs_init=runs_init)
+    y, Uy, happr, _, *report = UMC_generic(
+        draw_samples, evaluate, runs=runs, blocksize=blocksize, runs_init=runs_init,
+        nbins=nbins, adaptive=adaptive, ndig=ndig, credible_interval=credible_interval,
+        checkpoint=checkpoint, checkpoint_interval=checkpoint_interval,
+        resume_from=resume_from, n_cpu=n_cpu, executor=executor,
+    )
 
     # further post-calculation steps
     y_cred_low = np.zeros((len(nbins), len(y)))
@@ -519,7 +1201,26 @@ def UMC(
             y_cred_low[m, k] = interp_e((1 - credible_interval) / 2)
             y_cred_high[m, k] = interp_e((1 + credible_interval) / 2)
 
-    return y, Uy, y_cred_low, y_cred_high, happr
+    return (y, Uy, y_cred_low, y_cred_high, happr, *report)
+
+
+def _UMCdraw(size, ab, Uab, Na):
+    """Draw coefficients :math:`\\theta = [aa[1:], b]` of stable IIR filters
+
+    All draws are screened for stability at once, the ones of unstable filters are
+    replaced by new draws.
+    """
+    samples = np.zeros((0, len(ab)))
+    while len(samples) < size:
+        draws = np.random.multivariate_normal(ab, Uab, size)
+        stable = isstable_batch(np.hstack((np.ones((size, 1)), draws[:, : Na - 1])))
+        if not np.any(stable):
+            raise ValueError(
+                f"UMC: None of {size} draws of the filter coefficients results in a "
+                f"stable filter."
+            )
+        samples = np.vstack((samples, draws[stable]))
+    return samples[:size]
 
 
 def _UMCevaluate(th, nbb, x, Delta, phi, theta, sigma, blow, alow):
@@ -566,8 +1267,83 @@ def _UMCevaluate(th, nbb, x, Delta, phi, theta, sigma, blow, alow):
     return lfilter(bb, aa, xlow) + d
 
 
+@contextlib.contextmanager
+def _UMCmapper(n_cpu, blocksize, executor, chunksize):
+    """Map function of :func:`UMC_generic` and the number of processes it uses
+
+    A pool of processes set up for this purpose is closed and joined after use,
+    or terminated if an exception occurs.
+    """
+    if n_cpu is None:
+        n_cpu = os.cpu_count() or 1
+    # check if parallel computation is required
+    # this allows to circumvent a multiprocessing-problem on windows-machines
+    # see: https://github.com/PTB-PSt1/PyDynamic/issues/84
+    if executor is not None:
+        yield functools.partial(executor.map, chunksize=chunksize), n_cpu
+    elif n_cpu == 1:
+        yield map, 1
+    else:
+        nPool = min(n_cpu, blocksize)
+        with multiprocessing.Pool(nPool) as pool:
+            yield functools.partial(pool.imap, chunksize=chunksize), nPool
+            pool.close()
+            pool.join()
+
+
+def _UMCmap(map_func, evaluate, samples, vectorized, n_parts):
+    """Results of evaluate for a block of samples of :func:`UMC_generic`
+
+    If vectorized, the block is split into n_parts sub-blocks, which are
+    evaluated by one call of evaluate each.
+    """
+    if not vectorized:
+        return map_func(evaluate, samples)
+    parts = [part for part in np.array_split(np.asarray(samples), n_parts) if len(part)]
+    return itertools.chain.from_iterable(map_func(evaluate, parts))
+
+
+def _histograms(Y, edges):
+    """Histograms of the columns of Y as of :func:`numpy.histogram`
+
+    The bins of each column are equally spaced, such that the bin of each
+    element follows from its distance to the first edge and the bin width. As in
+    :func:`numpy.histogram`, elements found next to the computed bin due to
+    rounding are moved to the neighbouring bin, and elements outside the edges
+    are not counted.
+
+    Parameters
+    ----------
+        Y: np.ndarray of shape (n, N)
+            samples of N quantities
+        edges: np.ndarray of shape (nbins + 1, N)
+            equally spaced bin edges of each column of Y
+
+    Returns
+    -------
+        counts: np.ndarray of shape (nbins, N)
+            number of samples in each bin of each column
+    """
+    nbins, N = edges.shape[0] - 1, edges.shape[1]
+    first, last = edges[0], edges[-1]
+    columns = np.broadcast_to(np.arange(N), Y.shape)
+    keep = (Y >= first) & (Y <= last)
+    width = (last - first) / nbins
+    with np.errstate(divide="ignore", invalid="ignore"):
+        index = np.floor((Y - first) / np.where(width > 0, width, 1.0))
+    index = np.where(width > 0, index, nbins - 1)
+    index = np.clip(np.nan_to_num(index), 0, nbins - 1).astype(int)
+    index -= Y < edges[index, columns]
+    index += (Y >= edges[index + 1, columns]) & (index != nbins - 1)
+    counts = np.bincount(index[keep] * N + columns[keep], minlength=nbins * N)
+    return counts.reshape(nbins, N).astype(float)
+
+
 def UMC_generic(draw_samples, evaluate, runs = 100, blocksize = 8, runs_init = 10, nbins = 100,
-                return_samples = False, n_cpu = multiprocessing.cpu_count()):
+                return_samples = False, n_cpu = None,
+                adaptive = False, ndig = 2, credible_interval = 0.95, checkpoint = None,
+                checkpoint_interval = 600.0, resume_from = None, vectorized = False,
+                executor = None, chunksize = 1):
     """
     Generic Batch Monte Carlo using update formulae for mean, variance and (approximated) histogram.
     Assumes that the input and output of evaluate are numeric vectors (but not necessarily of same dimension).
@@ -581,6 +1357,9 @@ def UMC_generic(draw_samples, evaluate, runs = 100, blocksize = 8, runs_init = 1
         evaluate: function(sample)
             function that evaluates a sample and returns the result
             needs to return a (multi dimensional) numpy.ndarray
+            if vectorized, function(samples) that evaluates a block of samples
+            stacked along the first axis and returns the results stacked along
+            the first axis
         runs: int, optional
             number of Monte Carlo runs
         blocksize: int, optional
@@ -592,7 +1371,44 @@ def UMC_generic(draw_samples, evaluate, runs = 100, blocksize = 8, runs_init = 1
         return_samples: bool, optional
             see return-value of documentation
         n_cpu: int, optional
-            number of CPUs to use for multiprocessing, defaults to all available CPUs
+            number of CPUs to use for multiprocessing, defaults to all available CPUs.
+            The pool of processes set up for this purpose is shut down before
+            UMC_generic returns.
+        adaptive: bool, optional
+            whether to stop as soon as the results have stabilized according to
+            the adaptive Monte Carlo procedure of GUM-S1 7.9, in which consecutive
+            blocks are pooled into sets of at least 100 / (1 - credible_interval)
+            trials (GUM-S1 7.9.4). runs is then the maximum number of runs.
+        ndig: int, optional
+            number of significant decimal digits of the standard uncertainties
+            required to have stabilized in the adaptive procedure
+        credible_interval: float, optional
+            coverage probability of the intervals, which are required to have
+            stabilized in the adaptive procedure
+        checkpoint: str, optional
+            path of a file the state of the simulation is saved to in npz format
+            after a block, if at least checkpoint_interval seconds have passed
+            since the last checkpoint
+        checkpoint_interval: float, optional
+            minimum time in seconds between two checkpoints, default 600
+        resume_from: str, optional
+            path of a checkpoint to resume an interrupted simulation from. The
+            other parameters have to be the same as for the interrupted one. The
+            random state of :mod:`numpy.random` is restored, such that the
+            results are identical to those of an uninterrupted simulation, if
+            draw_samples and evaluate draw from it in this process (n_cpu=1).
+            As checkpoints contain pickled objects, only resume from trusted
+            files.
+        vectorized: bool, optional
+            whether evaluate accepts a block of samples. Each block is then
+            evaluated by one call, or split into one sub-block per process.
+        executor: concurrent.futures.Executor, optional
+            executor (or pool with a ``map`` method) the samples are evaluated
+            by instead of processes set up by UMC_generic, such that it can be
+            reused across calls. It is not shut down by UMC_generic.
+        chunksize: int, optional
+            number of samples (or sub-blocks, if vectorized) handed to a process
+            at once
 
     Example
     -------
@@ -628,6 +1444,15 @@ def UMC_generic(draw_samples, evaluate, runs = 100, blocksize = 8, runs_init = 1
             dict of samples and corresponding results of every evaluated simulation
             samples and results are saved in their original shape
 
+    If ``adaptive`` is ``True``, the method additionally returns (last):
+
+    Returns
+    -------
+        report: dict
+            number of runs carried out ("runs"), numerical tolerance of the
+            standard uncertainties ("tolerance") and whether the results have
+            stabilized ("converged")
+
     References
     ----------
         * Eichstädt, Link, Harris, Elster [Eichst2012]_
@@ -637,100 +1462,122 @@ def UMC_generic(draw_samples, evaluate, runs = 100, blocksize = 8, runs_init = 1
     if isinstance(nbins, int):
         nbins = [nbins]
 
-    # check if parallel computation is required
-    # this allows to circumvent a multiprocessing-problem on windows-machines
-    # see: https://github.com/PTB-PSt1/PyDynamic/issues/84
-    if n_cpu == 1:
-        map_func = map
-    else:
-        nPool = min(n_cpu, blocksize)
-        pool = multiprocessing.Pool(nPool)
-        map_func = pool.imap_unordered
-
-    # ------------ preparations for update formulae ------------
+    if adaptive and runs < _min_set_size(credible_interval):
+        raise ValueError(
+            "UMC_generic: the adaptive procedure requires sets of at least %d runs "
+            "for a credible interval of %g (GUM-S1 7.9.4), but got runs=%d."
+            % (_min_set_size(credible_interval), credible_interval, runs)
+        )
 
-    # set up list of MC results
-    Y_init = [None] * runs_init
+    # the samples are evaluated in this process, by the given executor or by a
+    # pool of processes, which is shut down once all blocks have been evaluated
+    with _UMCmapper(n_cpu, blocksize, executor, chunksize) as (map_func, nPool):
+        nblocks = math.ceil(runs / blocksize)
 
-    # init samples to be evaluated
-    samples = draw_samples(runs_init)
+        if resume_from is None:
+            # ------------ preparations for update formulae ------------
 
-    # evaluate the initial samples
-    for k, result in enumerate(map_func(evaluate, samples)):
-        Y_init[k] = result
-        progress_bar(k, runs_init, prefix="UMC initialisation:     ")
-    print("\n")  # to escape the carriage-return of progress_bar
+            # set up list of MC results
+            Y_init = [None] * runs_init
 
-    # get size of in- and output (was so far not explicitly known)
-    input_shape = samples[0].shape
-    output_shape = Y_init[0].shape
+            # init samples to be evaluated
+            samples = draw_samples(runs_init)
 
-    # convert to array
-    Y_init = np.asarray(Y_init)
+            # evaluate the initial samples
+            for k, result in enumerate(_UMCmap(map_func, evaluate, samples, vectorized, nPool)):
+                Y_init[k] = result
+                progress_bar(k, runs_init, prefix="UMC initialisation:     ")
+            print("\n")  # to escape the carriage-return of progress_bar
 
-    # prepare histograms
-    ymin = np.min(Y_init, axis=0).ravel()
-    ymax = np.max(Y_init, axis=0).ravel()
+            # get size of in- and output (was so far not explicitly known)
+            input_shape = samples[0].shape
+            output_shape = Y_init[0].shape
 
-    happr = {}
-    for nbin in nbins:
-        happr[nbin] = {}
-        happr[nbin]["bin-edges"] = np.linspace(ymin, ymax, num=nbin+1)           # define bin-edges (generates array for all [ymin,ymax] (assume ymin is already an array))
-        happr[nbin]["bin-counts"] = np.zeros((nbin, np.prod(output_shape)))   # init. bin-counts
+            # convert to array
+            Y_init = np.asarray(Y_init)
 
-    # ----------------- run MC block-wise -----------------------
+            # prepare histograms
+            ymin = np.min(Y_init, axis=0).ravel()
+            ymax = np.max(Y_init, axis=0).ravel()
 
-    nblocks = math.ceil(runs / blocksize)
+            happr = {}
+            for nbin in nbins:
+                happr[nbin] = {}
+                happr[nbin]["bin-edges"] = np.linspace(ymin, ymax, num=nbin+1)           # define bin-edges (generates array for all [ymin,ymax] (assume ymin is already an array))
+                happr[nbin]["bin-counts"] = np.zeros((nbin, np.prod(output_shape)))   # init. bin-counts
 
-    # remember all evaluated simulations, if wanted
-    if return_samples:
-        sims = {"samples": np.empty((runs, *input_shape)), "results": np.empty((runs, *output_shape))}
+            # remember all evaluated simulations, if wanted
+            if return_samples:
+                sims = {"samples": np.empty((runs, *input_shape)), "results": np.empty((runs, *output_shape))}
 
-    for m in range(nblocks):
-        if m == nblocks:
-            curr_block = runs % blocksize
+            # mean and covariance are updated block by block (formulae 7 and 8 in [Eichst2012])
+            moments = _MomentAccumulator(np.prod(output_shape))
+            if adaptive:
+                stopping = _AdaptiveStopping(np.prod(output_shape), ndig, credible_interval)
+            first_block = 0
         else:
-            curr_block = blocksize
+            saved = _load_checkpoint(resume_from, runs=runs, blocksize=blocksize,
+                                     nbins=nbins, return_samples=return_samples, adaptive=adaptive)
+            np.random.set_state(saved["random_state"])
+            input_shape, output_shape = saved["input_shape"], saved["output_shape"]
+            ymin, ymax, happr, moments = saved["ymin"], saved["ymax"], saved["happr"], saved["moments"]
+            if return_samples:
+                sims = saved["sims"]
+            if adaptive:
+                stopping = saved["stopping"]
+            first_block = saved["block"]
+        last_checkpoint = time.monotonic()
 
-        Y = np.empty((curr_block, np.prod(output_shape)))
-        samples = draw_samples(curr_block)
+        # ----------------- run MC block-wise -----------------------
 
-        # evaluate samples in parallel loop
-        for k, result in enumerate(map_func(evaluate, samples)):
-            Y[k] = result.ravel()
+        for m in range(first_block, nblocks):
+            curr_block = min(blocksize, runs - m * blocksize)
 
-        if m == 0:  # first block
-            y = np.mean(Y, axis=0)
-            Uy = np.matmul((Y - y).T, (Y - y))
+            Y = np.empty((curr_block, np.prod(output_shape)))
+            samples = draw_samples(curr_block)
 
-        else:  # updating y and Uy from results of current block
-            K0 = m * blocksize
-            K_seq = curr_block
+            # evaluate samples in parallel loop
+            for k, result in enumerate(_UMCmap(map_func, evaluate, samples, vectorized, nPool)):
+                Y[k] = result.ravel()
 
-            # update mean (formula 7 in [Eichst2012])
-            y0 = y
-            y = y0 + np.sum(Y - y0, axis=0) / (K0 + K_seq)
+            moments.add(Y)
 
-            # update covariance (formula 8 in [Eichst2012])
-            Uy = ( (K0-1)*Uy + K0*np.outer(y-y0, y-y0) + np.matmul((Y-y).T, (Y-y)) ) / (K0 + K_seq - 1)
-
-        # update histogram values
-        for k in range(np.prod(output_shape)):
+            # update histogram values of all output elements at once
             for h in happr.values():
-                h["bin-counts"][:,k] += np.histogram(Y[:,k], bins = h["bin-edges"][:,k])[0]  # numpy histogram returns (bin-counts, bin-edges)
-
-        ymin = np.min(np.vstack((ymin, Y)), axis=0)
-        ymax = np.max(np.vstack((ymax, Y)), axis=0)
-
-        # save results if wanted
-        if return_samples:
-            block_start = m * blocksize
-            block_end = block_start + curr_block
-            sims["samples"][block_start:block_end] = samples
-            sims["results"][block_start:block_end] = np.asarray([element.reshape(output_shape) for element in Y])
-
-        progress_bar(m*blocksize, runs, prefix="UMC running:            ")  # spaces on purpose, to match length of progress-bar below
-    print("\n") # to escape the carriage-return of progress_bar
+                h["bin-counts"] += _histograms(Y, h["bin-edges"])
+
+            ymin = np.min(np.vstack((ymin, Y)), axis=0)
+            ymax = np.max(np.vstack((ymax, Y)), axis=0)
+
+            # save results if wanted
+            if return_samples:
+                block_start = m * blocksize
+                block_end = block_start + curr_block
+                sims["samples"][block_start:block_end] = samples
+                sims["results"][block_start:block_end] = np.asarray([element.reshape(output_shape) for element in Y])
+
+            progress_bar(m*blocksize, runs, prefix="UMC running:            ")  # spaces on purpose, to match length of progress-bar below
+
+            if adaptive:
+                stopping.add_runs(Y)  # consecutive blocks are pooled into sets
+                if stopping.converged:
+                    break
+
+            if (checkpoint is not None and m + 1 < nblocks
+                    and time.monotonic() - last_checkpoint >= checkpoint_interval):
+                saved = dict(runs=runs, blocksize=blocksize, nbins=nbins,
+                             return_samples=return_samples, adaptive=adaptive, block=m + 1,
+                             random_state=np.random.get_state(), input_shape=input_shape,
+                             output_shape=output_shape, ymin=ymin, ymax=ymax, happr=happr,
+                             moments=moments)
+                if return_samples:
+                    saved["sims"] = sims
+                if adaptive:
+                    saved["stopping"] = stopping
+                _save_checkpoint(checkpoint, **saved)
+                last_checkpoint = time.monotonic()
+        print("\n") # to escape the carriage-return of progress_bar
+    y, Uy = moments.mean, moments.cov()
 
     # ----------------- post-calculation steps -----------------------
 
@@ -739,7 +1586,9 @@ def UMC_generic(draw_samples, evaluate, runs = 100, blocksize = 8, runs_init = 1
         h["bin-edges"][0, :] = np.min(np.vstack((ymin, h["bin-edges"][0, :])), axis=0)
         h["bin-edges"][-1, :] = np.min(np.vstack((ymax, h["bin-edges"][-1, :])), axis=0)
 
+    result = (y, Uy, happr, output_shape)
     if return_samples:
-        return y, Uy, happr, output_shape, sims
-    else:
-        return y, Uy, happr, output_shape
+        result += ({key: value[: moments.n] for key, value in sims.items()},)
+    if adaptive:
+        result += (stopping.report(moments.n),)
+    return result
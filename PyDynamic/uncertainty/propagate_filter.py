@@ -7,8 +7,16 @@ This modules contains the following functions:
 
 * :func:`FIRuncFilter`: Uncertainty propagation for signal y and uncertain FIR
   filter theta
+* :class:`FIRuncFilterPlan`: Uncertainty propagation for signals y and uncertain
+  FIR filter theta with precomputation of all signal-independent parts
+* :class:`FIRuncFilterStream`: Uncertainty propagation for signal y given in
+  consecutive chunks and uncertain FIR filter theta
+* :class:`FIRuncFilterCovariance`: Structured covariance of the output signal
+  of an uncertain FIR filter
 * :func:`IIRuncFilter`: Uncertainty propagation for the signal x and the uncertain
   IIR filter (b,a)
+* :func:`SOSuncFilter`: Uncertainty propagation for the signal x and the uncertain
+  IIR filter given as second-order sections
 
 .. note:: The Elster-Link paper for FIR filters assumes that the autocovariance
           is known and that noise is stationary!
@@ -16,25 +24,69 @@ This modules contains the following functions:
 """
 
 import numpy as np
-from scipy.linalg import toeplitz
-from scipy.signal import lfilter, lfilter_zi, dimpulse
+from scipy.linalg import solve_discrete_lyapunov, toeplitz
+from scipy.signal import (
+    dimpulse,
+    fftconvolve,
+    lfilter,
+    oaconvolve,
+    sosfilt,
+    tf2ss,
+)
 from ..misc.tools import trimOrPad
 
-__all__ = ["FIRuncFilter", "IIRuncFilter"]
-
-
-def FIRuncFilter(y, sigma_noise, theta, Utheta=None, shift=0, blow=None, kind="corr"):
+__all__ = [
+    "FIRuncFilter",
+    "FIRuncFilterPlan",
+    "FIRuncFilterStream",
+    "FIRuncFilterCovariance",
+    "IIRuncFilter",
+    "SOSuncFilter",
+]
+
+# maximum number of array elements of intermediate results evaluated at once
+_MAX_BLOCK_ELEMENTS = 2 ** 22
+
+# relative magnitude below which a decaying impulse response is treated as zero
+_DECAYED = np.finfo(float).eps ** 2
+
+# minimum number of filter coefficients for FFT-based convolution with "auto"
+_FFT_MIN_TAPS = 256
+
+
+def FIRuncFilter(
+    y,
+    sigma_noise,
+    theta,
+    Utheta=None,
+    shift=0,
+    blow=None,
+    kind="corr",
+    method="eig",
+    conv_method="auto",
+    return_cov=False,
+):
     """Uncertainty propagation for signal y and uncertain FIR filter theta
 
     A preceding FIR low-pass filter with coefficients `blow` can be provided optionally.
 
+    Several channels sharing the same filter can be processed at once by providing
+    `y` of shape (channels, N). The uncertainty-independent computations are then
+    carried out only once and all channels are filtered together.
+
     Parameters
     ----------
-        y: np.ndarray
+        y: np.ndarray of shape (N,) or (channels, N)
             filter input signal
         sigma_noise: float or np.ndarray
             float:    standard deviation of white noise in y
             1D-array: interpretation depends on kind
+            2D-array: only for y of shape (channels, N), one row per channel,
+            interpretation of each row depends on kind (for channel-wise white
+            noise provide the standard deviations of shape (channels, 1) with
+            kind="diag", as for :func:`IIRuncFilter`). A 1D-array of length
+            channels is rejected for kind="corr" as ambiguous, provide an
+            autocovariance shared by all channels as shape (1, L) then.
         theta: np.ndarray
             FIR filter coefficients
         Utheta: np.ndarray, optional
@@ -50,13 +102,33 @@ def FIRuncFilter(y, sigma_noise, theta, Utheta=None, shift=0, blow=None, kind="c
             "diag": point-wise standard uncertainties of non-stationary white noise
             "corr": single sided autocovariance of stationary (colored/correlated)
             noise (default)
+        method: string, optional
+            how to evaluate the point-wise contribution of Utheta, only meaningful
+            in combination with Utheta provided
+            "eig": eigendecomposition of Utheta and convolution of the low-pass
+            filtered signal with the scaled eigenvectors (default)
+            "loop": explicit evaluation of the quadratic form for every sample
+        conv_method: string, optional
+            how to evaluate the convolutions with blow, theta and the kernels of the
+            uncertainty evaluation
+            "auto": FFT-based overlap-add convolution for long filters, direct
+            convolution otherwise (default)
+            "direct": direct convolution with :func:`scipy.signal.lfilter`
+            "fft": FFT-based overlap-add convolution with
+            :func:`scipy.signal.oaconvolve`
+        return_cov: bool, optional
+            if True, additionally return the covariance of the output signal as
+            :class:`FIRuncFilterCovariance`, only available for y of shape (N,)
+            (defaults to False)
 
     Returns
     -------
-        x: np.ndarray
+        x: np.ndarray of the same shape as y
             FIR filter output signal
-        ux: np.ndarray
+        ux: np.ndarray of the same shape as y
             point-wise standard uncertainties associated with x
+        Ux: FIRuncFilterCovariance
+            covariance associated with x, only returned if return_cov is True
 
 
     References
@@ -64,16 +136,562 @@ def FIRuncFilter(y, sigma_noise, theta, Utheta=None, shift=0, blow=None, kind="c
         * Elster and Link 2008 [Elster2008]_
 
     .. seealso:: :mod:`PyDynamic.deconvolution.fit_filter`
+                 :class:`FIRuncFilterPlan`
+                 :class:`FIRuncFilterStream`
+                 :class:`FIRuncFilterCovariance`
+
+    """
+
+    plan = FIRuncFilterPlan(
+        theta,
+        Utheta=Utheta,
+        blow=blow,
+        sigma_noise=sigma_noise,
+        kind=kind,
+        method=method,
+        conv_method=conv_method,
+    )
+
+    return plan.apply(y, shift=shift, return_cov=return_cov)
+
+
+class FIRuncFilterPlan:
+    """Precomputed uncertainty propagation for an uncertain FIR filter theta
+
+    Everything that does not depend on the filter input signal is computed once
+    when the plan is created: the covariance Ulow of the low-pass filtered noise and
+    the static part of the uncertainty for stationary noise, the kernels used for
+    non-stationary white noise (``kind="diag"``) and the factorization of Utheta.
+    Repeated calls of :meth:`apply` for signals sharing the same filter and noise
+    model then only cost the data-dependent work.
+
+    Parameters
+    ----------
+        theta: np.ndarray
+            FIR filter coefficients
+        Utheta: np.ndarray, optional
+            covariance matrix associated with theta
+        blow: np.ndarray, optional
+            optional FIR low-pass filter
+        sigma_noise: float or np.ndarray, optional
+            noise model used by :meth:`apply` if no other is given there, see
+            :func:`FIRuncFilter`
+        kind: string
+            only meaningful in combination with sigma_noise a 1D numpy array
+            "diag": point-wise standard uncertainties of non-stationary white noise
+            "corr": single sided autocovariance of stationary (colored/correlated)
+            noise (default)
+        method: string, optional
+            how to evaluate the point-wise contribution of Utheta, see
+            :func:`FIRuncFilter`
+        conv_method: string, optional
+            how to evaluate convolutions, see :func:`FIRuncFilter`
 
+    Example
+    -------
+        ``plan = FIRuncFilterPlan(theta, Utheta, blow=blow, sigma_noise=sigma_noise)``
+        ``for y in measurements:``
+        ``    x, ux = plan.apply(y)``
+
+    .. seealso:: :func:`FIRuncFilter`
+                 :class:`FIRuncFilterStream`
     """
 
-    Ntheta = len(theta)  # FIR filter size
+    def __init__(
+        self,
+        theta,
+        Utheta=None,
+        blow=None,
+        sigma_noise=None,
+        kind="corr",
+        method="eig",
+        conv_method="auto",
+    ):
+        self.theta = np.asarray(theta).ravel()
+        self.Utheta = Utheta
+        self.blow = blow
+        self.sigma_noise = _as_noise_array(sigma_noise)
+        self.kind = kind
+        self.method = method
+        self.conv_method = conv_method
+
+        if conv_method not in ("auto", "direct", "fft"):
+            raise ValueError(f"FIRuncFilter: unknown conv_method '{conv_method}'")
+
+        # the factorization of Utheta does not depend on the signal
+        if method == "eig":
+            self._Utheta_factors = _factorize_Utheta(Utheta)
+        elif method == "loop":
+            self._Utheta_factors = None
+        else:
+            raise ValueError(f"FIRuncFilter: unknown method '{method}'")
+
+        # kernels for non-stationary white noise do not depend on the variances
+        if kind == "diag":
+            self._diag_kernels = _fir_diag_kernels(self.theta, Utheta, blow)
+
+        # static part of uncertainty of the default (stationary) noise model
+        self._UncCov = None
+        if self.sigma_noise is not None and not self._is_diag(self.sigma_noise):
+            self._UncCov = self._static_uncertainty(self.sigma_noise)
+
+    def apply(self, y, sigma_noise=None, shift=0, return_cov=False):
+        """Propagate a signal through the uncertain FIR filter
+
+        The signal is assumed to be stationary before its first sample.
+
+        Parameters
+        ----------
+            y: np.ndarray of shape (N,) or (channels, N)
+                filter input signal
+            sigma_noise: float or np.ndarray, optional
+                noise model of y, see :func:`FIRuncFilter`, defaults to the one
+                given on creation of the plan
+            shift: int, optional
+                time delay of filter output signal (in samples) (defaults to 0)
+            return_cov: bool, optional
+                if True, additionally return the covariance of the output signal,
+                only available for y of shape (N,) (defaults to False)
+
+        Returns
+        -------
+            x: np.ndarray of the same shape as y
+                FIR filter output signal
+            ux: np.ndarray of the same shape as y
+                point-wise standard uncertainties associated with x
+            Ux: FIRuncFilterCovariance
+                covariance associated with x, only returned if return_cov is True
+        """
+        y = np.asarray(y)
+        if return_cov and y.ndim != 1:
+            raise ValueError(
+                f"FIRuncFilter: The covariance of the output signal is only "
+                f"available for input signals y of shape (N,), but y is of shape "
+                f"{y.shape}."
+            )
+
+        # a single call is the same as streaming the whole signal as one chunk
+        x, ux, xlow_extended, sigma2_extended = self.stream()._filter(y, sigma_noise)
+
+        # correct for delay
+        x = np.roll(x, -int(shift), axis=-1)
+        ux = np.roll(ux, -int(shift), axis=-1)
+
+        if not return_cov:
+            return x, ux
+
+        if sigma_noise is None:
+            sigma_noise = self.sigma_noise
+        Ux = self._output_covariance(
+            sigma_noise, xlow_extended, sigma2_extended, shift=int(shift)
+        )
+
+        return x, ux, Ux
+
+    def stream(self):
+        """Create a :class:`FIRuncFilterStream` sharing the precomputations"""
+        return FIRuncFilterStream(plan=self)
+
+    def _is_diag(self, sigma_noise):
+        """Whether sigma_noise describes non-stationary white noise
+
+        Channel-wise standard deviations of shape (channels, 1) describe stationary
+        white noise, whose variances are single sided autocovariances of length one.
+        """
+        return (
+            self.kind == "diag"
+            and isinstance(sigma_noise, np.ndarray)
+            and not (sigma_noise.ndim == 2 and sigma_noise.shape[-1] == 1)
+        )
+
+    def _static_uncertainty(self, sigma_noise):
+        """Static (channel-wise) point-wise constant part of uncertainty
+
+        Only applicable to stationary noise, for non-stationary white noise
+        (``kind="diag"``) the uncertainty depends on the variance history and is
+        evaluated by :meth:`FIRuncFilterStream.filter`.
+        """
+        sigma2 = _fir_noise_variance(sigma_noise, self.kind)
+
+        if isinstance(sigma2, np.ndarray) and sigma2.ndim == 2:
+            # channel-wise stationary noise
+            return np.array([[self._stationary_uncertainty(s2)] for s2 in sigma2])
+        else:
+            return self._stationary_uncertainty(sigma2)
+
+    def _stationary_uncertainty(self, sigma2):
+        """Static part of the uncertainty for stationary noise"""
+        Ulow = _fir_stationary_Ulow(sigma2, self.kind, len(self.theta), self.blow)
+
+        # NOTE: In the code below whereever `theta` or `Utheta` get used, they need to be flipped. 
+        #       This is necessary to take the time-order of both variables into account. (Which is descending
+        #       for `theta` and `Utheta` but ascending for `Ulow`.)
+        #       
+        #       Further details and illustrations showing the effect of not-flipping
+        #       can be found at https://github.com/PTB-PSt1/PyDynamic/issues/183
+        UncCov = np.flip(self.theta).dot(Ulow.dot(np.flip(self.theta)))  # static part of uncertainty
+        if isinstance(self.Utheta, np.ndarray):
+            UncCov += np.abs(np.trace(Ulow.dot(np.flip(self.Utheta))))
+
+        return UncCov
+
+    def _output_covariance(self, sigma_noise, xlow_extended, sigma2_extended, shift=0):
+        """Structured covariance of the output signal of a single channel
+
+        With x[n] = sum_i theta[i] * xlow[n - i] the covariance of x[n] and x[m]
+        is the sum of ``sum_ij Q[i, j] * Cov(xlow[n - i], xlow[m - j])`` with
+        ``Q = theta theta^T + Utheta``, which vanishes for ``|n - m|`` larger than
+        the correlation length of the low-pass filtered noise plus Ntheta - 1, and
+        ``xlow[n - .]^T Utheta xlow[m - .]``, which is of rank at most Ntheta.
+        """
+        theta = self.theta
+        Ntheta = len(theta)
+        N = xlow_extended.shape[-1] - Ntheta + 1
+
+        # only the symmetric part of Utheta contributes to a covariance
+        Q = np.outer(theta, theta)
+        if isinstance(self.Utheta, np.ndarray):
+            Q = Q + 0.5 * (self.Utheta + self.Utheta.T)
+
+        if sigma2_extended is not None:
+            band = _fir_diag_band(sigma2_extended, Q, self.blow, self.conv_method)
+        else:
+            sigma2 = _fir_noise_variance(sigma_noise, self.kind)
+            band = _fir_stationary_band(sigma2, self.kind, Q, N, self.blow)
+
+        factors = signs = None
+        if isinstance(self.Utheta, np.ndarray):
+            Utheta_factors = self._Utheta_factors
+            if Utheta_factors is None:
+                Utheta_factors = _factorize_Utheta(self.Utheta)
+            factors = np.array(
+                [
+                    _fir_valid(factor, xlow_extended, self.conv_method)
+                    for factor in Utheta_factors[0].T
+                ]
+            ).reshape((-1, N))
+            signs = Utheta_factors[1]
+
+        return FIRuncFilterCovariance(band, factors, signs, shift=shift)
+
+
+class FIRuncFilterStream:
+    """Stateful uncertainty propagation for a signal y given in consecutive chunks
+
+    Applies the same computations as :func:`FIRuncFilter`, but keeps the last
+    ``len(blow) - 1`` input samples as state of the low-pass filter, the last
+    ``Ntheta - 1`` low-pass filtered samples as state of the FIR filter and, for
+    ``kind="diag"``, the history of the noise variance between calls of
+    :meth:`filter`. Filtering a signal chunk by chunk thus yields
+    the same result as filtering the whole signal at once, while the memory
+    requirement only depends on the chunk length.
+
+    As for :func:`FIRuncFilter` the signal is assumed to be stationary before its
+    first sample. A time delay of the output (``shift`` in :func:`FIRuncFilter`)
+    cannot be applied by shifting inside a chunk and is thus left to the caller.
+
+    Parameters
+    ----------
+        theta: np.ndarray
+            FIR filter coefficients
+        Utheta: np.ndarray, optional
+            covariance matrix associated with theta
+        blow: np.ndarray, optional
+            optional FIR low-pass filter
+        kind: string
+            only meaningful in combination with sigma_noise a 1D numpy array
+            "diag": point-wise standard uncertainties of non-stationary white noise
+            "corr": single sided autocovariance of stationary (colored/correlated)
+            noise (default)
+        method: string, optional
+            how to evaluate the point-wise contribution of Utheta, see
+            :func:`FIRuncFilter`
+        conv_method: string, optional
+            how to evaluate convolutions, see :func:`FIRuncFilter`
+        sigma_noise: float or np.ndarray, optional
+            noise model used by :meth:`filter` if no other is given there
+        plan: FIRuncFilterPlan, optional
+            precomputed plan to use instead of the above parameters
+
+    Example
+    -------
+        ``stream = FIRuncFilterStream(theta, Utheta, blow=blow)``
+        ``for y_chunk in chunks:``
+        ``    x_chunk, ux_chunk = stream.filter(y_chunk, sigma_noise)``
+
+    .. seealso:: :func:`FIRuncFilter`
+                 :class:`FIRuncFilterPlan`
+    """
+
+    def __init__(
+        self,
+        theta=None,
+        Utheta=None,
+        blow=None,
+        kind="corr",
+        method="eig",
+        conv_method="auto",
+        sigma_noise=None,
+        plan=None,
+    ):
+        if plan is None:
+            plan = FIRuncFilterPlan(
+                theta,
+                Utheta,
+                blow,
+                sigma_noise=sigma_noise,
+                kind=kind,
+                method=method,
+                conv_method=conv_method,
+            )
+        self.plan = plan
+
+        self.reset()
+
+    def reset(self):
+        """Forget the carried state, the next chunk is treated as a new signal"""
+        self._y_history = None  # last len(blow) - 1 input samples
+        self._xlow_history = None  # last Ntheta - 1 low-pass filtered samples
+        self._sigma2_history = None  # noise variance history for kind == "diag"
+
+    def filter(self, y, sigma_noise=None):
+        """Propagate the next chunk of the signal through the uncertain FIR filter
+
+        Parameters
+        ----------
+            y: np.ndarray of shape (N,) or (channels, N)
+                next chunk of the filter input signal
+            sigma_noise: float or np.ndarray, optional
+                float:    standard deviation of white noise in y
+                1D-array: interpretation depends on kind, for ``kind="diag"`` the
+                point-wise standard uncertainties of the current chunk
+                2D-array: one row per channel, see :func:`FIRuncFilter`
+                defaults to the noise model given on creation
+
+        Returns
+        -------
+            x: np.ndarray of the same shape as y
+                FIR filter output signal of the current chunk
+            ux: np.ndarray of the same shape as y
+                point-wise standard uncertainties associated with x
+        """
+        x, ux, _, _ = self._filter(y, sigma_noise)
+
+        return x, ux
+
+    def _filter(self, y, sigma_noise=None):
+        """Same as :meth:`filter`, but also return the extended intermediate signals
+
+        Besides x and ux the low-pass filtered signal preceded by the Ntheta - 1
+        samples before and, for non-stationary white noise, the noise variances
+        preceded by the ``Ntheta + len(blow) - 2`` variances before (None otherwise)
+        are returned.
+        """
+        plan = self.plan
+        theta = plan.theta
+        blow = plan.blow
+        Ntheta = len(theta)  # FIR filter size
+
+        if sigma_noise is None:
+            sigma_noise = plan.sigma_noise
+            UncCov = plan._UncCov
+        else:
+            sigma_noise = _as_noise_array(sigma_noise)
+            UncCov = None
+
+        y = np.asarray(y)
+        if y.ndim not in (1, 2) or np.ndim(sigma_noise) > y.ndim:
+            raise ValueError(
+                f"FIRuncFilter: Input signal y is expected to be of shape (N,) or "
+                f"(channels, N) and sigma_noise may only be two-dimensional in the "
+                f"latter case, but shapes {y.shape} and {np.shape(sigma_noise)} are "
+                f"given."
+            )
+        if (
+            plan.kind == "corr"
+            and y.ndim == 2
+            and np.ndim(sigma_noise) == 1
+            and len(y) > 1
+            and len(sigma_noise) == len(y)
+        ):
+            raise ValueError(
+                f"FIRuncFilter: A one-dimensional sigma_noise of length {len(y)} for "
+                f"{len(y)} channels is ambiguous. Provide channel-wise standard "
+                f"deviations of white noise of shape (channels, 1) with kind='diag' "
+                f"or an autocovariance shared by all channels of shape (1, L)."
+            )
+
+        # calculate low-pass filtered signal, assume stationarity before first chunk
+        # (all channels are filtered at once along the last axis), which is the
+        # same as the initial condition y[0] * lfilter_zi(blow, 1.0) of lfilter
+        if isinstance(blow, np.ndarray):
+            if self._y_history is None:
+                self._y_history = y[..., :1] * np.ones(len(blow) - 1)
+            y_extended = np.concatenate((self._y_history, y), axis=-1)
+            self._y_history = _tail(y_extended, len(blow) - 1)
+            xlow = _fir_valid(blow, y_extended, plan.conv_method)
+        else:
+            xlow = y
+
+        # apply FIR filter to calculate best estimate in accordance with GUM, use
+        # extended signal to take the samples of previous chunks into account
+        if self._xlow_history is None:
+            self._xlow_history = xlow[..., :1] * np.ones(Ntheta - 1)
+        xlow_extended = np.concatenate((self._xlow_history, xlow), axis=-1)
+        self._xlow_history = _tail(xlow_extended, Ntheta - 1)
+        x = _fir_valid(theta, xlow_extended, plan.conv_method)
+
+        sigma2_extended = None
+        if plan._is_diag(sigma_noise):
+            # Ulow differs from sample to sample and is taken from the covariance of
+            # the low-pass filtered noise, which depends on the variance history
+            sigma2 = _fir_noise_variance(sigma_noise, plan.kind)
+            n_history = Ntheta + _len_or_one(blow) - 2
+            if self._sigma2_history is None:
+                self._sigma2_history = sigma2[..., :1] * np.ones(n_history)
+            sigma2_extended = np.concatenate((self._sigma2_history, sigma2), axis=-1)
+            self._sigma2_history = _tail(sigma2_extended, n_history)
+
+            UncCov = _fir_diag_uncertainty(
+                sigma2_extended, *plan._diag_kernels, conv_method=plan.conv_method
+            )
+
+        elif UncCov is None:
+            UncCov = plan._static_uncertainty(sigma_noise)
+
+        if isinstance(plan.Utheta, np.ndarray):
+            unc = _fir_Utheta_term(
+                xlow_extended, plan.Utheta, plan._Utheta_factors, plan.conv_method
+            )
+        else:
+            unc = np.zeros_like(xlow)
+
+        ux = np.sqrt(np.abs(UncCov + unc))
+
+        return x, ux, xlow_extended, sigma2_extended
 
+
+class FIRuncFilterCovariance:
+    """Covariance matrix of the output signal of an uncertain FIR filter
+
+    The (N x N) covariance matrix is never formed explicitly. It is stored as the
+    sum of a symmetric band matrix, resulting from the noise of the input signal,
+    and a matrix of low rank, resulting from the uncertainty of the filter
+    coefficients applied to the (uncertain) input signal. Thus the memory
+    requirement is of order N * Ntheta instead of N * N.
+
+    Instances are returned by :func:`FIRuncFilter` and
+    :meth:`FIRuncFilterPlan.apply` for ``return_cov=True``.
+
+    Parameters
+    ----------
+        band: np.ndarray of shape (width, N)
+            ``band[d, n]`` is the covariance of x[n] and x[n + d] of the band part
+            (before the delay is corrected for), zero for n + d >= N
+        factors: np.ndarray of shape (K, N), optional
+            factors of the low-rank part ``factors^T diag(signs) factors``
+        signs: np.ndarray of shape (K,), optional
+            signs of the low-rank part
+        shift: int, optional
+            time delay of the filter output signal (in samples) the covariance
+            has been corrected for (defaults to 0)
+    """
+
+    def __init__(self, band, factors=None, signs=None, shift=0):
+        self.band = band
+        self.factors = factors
+        self.signs = signs
+        self.shift = shift
+
+    @property
+    def shape(self):
+        """Shape (N, N) of the covariance matrix"""
+        N = self.band.shape[1]
+        return N, N
+
+    def diag(self):
+        """Variances of the output signal, i.e. the squared point-wise uncertainties
+
+        Returns
+        -------
+            np.ndarray of shape (N,)
+        """
+        variances = self.band[0].copy()
+        if self.factors is not None:
+            variances += self.signs.dot(self.factors ** 2)
+
+        return np.roll(variances, -self.shift)
+
+    def matvec(self, v):
+        """Matrix-vector product of the covariance matrix with v
+
+        Parameters
+        ----------
+            v: np.ndarray of shape (N,)
+
+        Returns
+        -------
+            np.ndarray of shape (N,)
+        """
+        N = self.shape[0]
+        v = np.roll(v, self.shift)  # undo the correction for the delay
+
+        result = self.band[0] * v
+        for d in range(1, min(self.band.shape[0], N)):
+            result[: N - d] += self.band[d, : N - d] * v[d:]
+            result[d:] += self.band[d, : N - d] * v[: N - d]
+        if self.factors is not None:
+            result += self.factors.T.dot(self.signs * self.factors.dot(v))
+
+        return np.roll(result, -self.shift)
+
+    def block(self, i0, i1):
+        """Dense diagonal block of the covariance matrix
+
+        Parameters
+        ----------
+            i0, i1: int
+                first and one past the last index of the output samples
+
+        Returns
+        -------
+            np.ndarray of shape (i1 - i0, i1 - i0)
+                covariance of x[i0:i1]
+        """
+        N = self.shape[0]
+        index = (np.arange(i0, i1) + self.shift) % N
+
+        lag = np.abs(index[np.newaxis, :] - index[:, np.newaxis])
+        first = np.minimum(index[np.newaxis, :], index[:, np.newaxis])
+        inside = lag < self.band.shape[0]
+        cov = np.zeros(lag.shape)
+        cov[inside] = self.band[lag[inside], first[inside]]
+
+        if self.factors is not None:
+            factors = self.factors[:, index]
+            cov += (factors.T * self.signs).dot(factors)
+
+        return cov
+
+    def todense(self):
+        """Dense (N x N) covariance matrix, only feasible for short signals"""
+        return self.block(0, self.shape[0])
+
+
+def _as_noise_array(sigma_noise):
+    """Convert a sequence sigma_noise into an array, floats and arrays are kept"""
+    if isinstance(sigma_noise, (list, tuple)):
+        return np.asarray(sigma_noise, dtype=float)
+    return sigma_noise
+
+
+def _fir_noise_variance(sigma_noise, kind):
+    """Translate sigma_noise into the variance (float) or variance array of y"""
     # check which case of sigma_noise is necessary
     if isinstance(sigma_noise, float):
         sigma2 = sigma_noise ** 2
 
-    elif isinstance(sigma_noise, np.ndarray) and len(sigma_noise.shape) == 1:
+    elif isinstance(sigma_noise, np.ndarray) and len(sigma_noise.shape) in (1, 2):
         if kind == "diag":
             sigma2 = sigma_noise ** 2
         elif kind == "corr":
@@ -84,162 +702,418 @@ def FIRuncFilter(y, sigma_noise, theta, Utheta=None, shift=0, blow=None, kind="c
     else:
         raise ValueError(
             f"FIRuncFilter: Uncertainty sigma_noise associated "
-            f"with input signal is expected to be either a float or a 1D array but "
+            f"with input signal is expected to be either a float or a 1D or 2D array but "
             f"is of shape {sigma_noise.shape}. Please check documentation for input "
             f"parameters sigma_noise and kind for more information."
         )
 
+    return sigma2
+
+
+def _fir_stationary_Ulow(sigma2, kind, Ntheta, blow=None):
+    """Covariance (Ntheta x Ntheta) of Ntheta consecutive low-pass filtered samples
+
+    Only applicable to stationary noise, i.e. sigma2 being a float or for
+    ``kind="corr"`` the single sided autocovariance of the noise.
+    """
+    return toeplitz(_fir_stationary_acf(sigma2, kind, Ntheta, blow))
+
 
-    if isinstance(blow,np.ndarray):             # calculate low-pass filtered signal and propagate noise
+def _fir_stationary_acf(sigma2, kind, n_lags, blow=None):
+    """Single sided autocovariance (n_lags,) of the low-pass filtered noise
+
+    Only applicable to stationary noise, i.e. sigma2 being a float or for
+    ``kind="corr"`` the single sided autocovariance of the noise.
+    """
+    if isinstance(blow, np.ndarray):  # propagate noise through low-pass filter
 
         if isinstance(sigma2, float):
-            Bcorr = np.correlate(blow, blow, 'full') # len(Bcorr) == 2*Ntheta - 1
+            Bcorr = np.correlate(blow, blow, 'full') # len(Bcorr) == 2*len(blow) - 1
             ycorr = sigma2 * Bcorr[len(blow)-1:]     # only the upper half of the correlation is needed
 
-            # trim / pad to length Ntheta
-            ycorr = trimOrPad(ycorr, Ntheta)
-            Ulow = toeplitz(ycorr)
+            # trim / pad to length n_lags
+            ycorr = trimOrPad(ycorr, n_lags)
 
-        elif isinstance(sigma2, np.ndarray):
+        else:  # kind == "corr"
 
-            if kind == "diag":
-                # [Leeuw1994](Covariance matrix of ARMA errors in closed form) can be used, to derive this formula
-                # The given "blow" corresponds to a MA(q)-process.
-                # Going through the calculations of Leeuw, but assuming
-                # that E(vv^T) is a diagonal matrix with non-identical elements,
-                # the covariance matrix V becomes (see Leeuw:corollary1)
-                # V = N * SP * N^T + M * S * M^T
-                # N, M are defined as in the paper
-                # and SP is the covariance of input-noise prior to the observed time-interval
-                # (SP needs be available len(blow)-timesteps into the past. Here it is
-                # assumed, that SP is constant with the first value of sigma2)
+            # adjust the lengths sigma2 to fit blow and n_lags
+            # this either crops (unused) information or appends zero-information
+            # note1: this is the reason, why Ulow will have dimension (Ntheta x Ntheta) without further ado
 
-                # V needs to be extended to cover Ntheta-1 timesteps more into the past
-                sigma2_extended = np.append(sigma2[0] * np.ones((Ntheta - 1)), sigma2)
+            # calculate Bcorr
+            Bcorr = np.correlate(blow, blow, "full")
 
-                N = toeplitz(blow[1:][::-1], np.zeros_like(sigma2_extended)).T
-                M = toeplitz(trimOrPad(blow, len(sigma2_extended)), np.zeros_like(sigma2_extended))
-                SP = np.diag(sigma2[0] * np.ones_like(blow[1:]))
-                S = np.diag(sigma2_extended)
+            # pad or crop length of sigma2, then reflect some part to the left and invert the order
+            # [0 1 2 3 4 5 6 7] --> [0 0 0 7 6 5 4 3 2 1 0 1 2 3]
+            sigma2 = trimOrPad(sigma2, len(blow) + n_lags - 1)
+            sigma2_reflect = np.pad(sigma2, (len(blow) - 1, 0), mode="reflect")
 
-                # Ulow is to be sliced from V, see below
-                V = N.dot(SP).dot(N.T) + M.dot(S).dot(M.T)
+            ycorr = np.correlate(sigma2_reflect, Bcorr, mode="valid") # used convolve in a earlier version, should make no difference as Bcorr is symmetric
 
-            elif kind == "corr":
+    else:  # if blow is not provided
+        if isinstance(sigma2, float):
+            ycorr = trimOrPad(np.array([sigma2]), n_lags)
 
-                # adjust the lengths sigma2 to fit blow and theta
-                # this either crops (unused) information or appends zero-information
-                # note1: this is the reason, why Ulow will have dimension (Ntheta x Ntheta) without further ado
+        else:  # kind == "corr"
+            ycorr = trimOrPad(sigma2, n_lags)
 
-                # calculate Bcorr
-                Bcorr = np.correlate(blow, blow, "full")
+    return ycorr
 
-                # pad or crop length of sigma2, then reflect some part to the left and invert the order
-                # [0 1 2 3 4 5 6 7] --> [0 0 0 7 6 5 4 3 2 1 0 1 2 3]
-                sigma2 = trimOrPad(sigma2, len(blow) + Ntheta - 1)
-                sigma2_reflect = np.pad(sigma2, (len(blow) - 1, 0), mode="reflect")
 
-                ycorr = np.correlate(sigma2_reflect, Bcorr, mode="valid") # used convolve in a earlier version, should make no difference as Bcorr is symmetric
-                Ulow = toeplitz(ycorr)
+def _fir_stationary_band(sigma2, kind, Q, N, blow=None):
+    """Band part of the output covariance for stationary noise
 
-        xlow, _ = lfilter(blow, 1.0, y, zi=y[0] * lfilter_zi(blow, 1.0))
+    Parameters
+    ----------
+        sigma2: float or np.ndarray
+            noise variance or single sided autocovariance of the noise
+        kind: string
+            see :func:`FIRuncFilter`
+        Q: np.ndarray of shape (Ntheta, Ntheta)
+            sum of theta theta^T and (the symmetric part of) Utheta
+        N: int
+            number of output samples
+        blow: np.ndarray, optional
+            optional FIR low-pass filter
 
-    else:  # if blow is not provided
-        if isinstance(sigma2, float):
-            Ulow = np.eye(Ntheta) * sigma2
+    Returns
+    -------
+        band: np.ndarray of shape (width, N)
+            see :class:`FIRuncFilterCovariance`
+    """
+    Ntheta = len(Q)
+    n_lags = _len_or_one(blow)
+    if not isinstance(sigma2, float):
+        n_lags += len(sigma2) - 1
+    acf = _fir_stationary_acf(sigma2, kind, n_lags, blow)
+    width = n_lags + Ntheta - 1
 
-        elif isinstance(sigma2, np.ndarray):
+    # the covariance of x[n] and x[n + d] is sum_k q[k] * acf(|d + k|) with q the
+    # sums along the diagonals i - j = k of Q
+    q = np.array([np.trace(Q, offset=-k) for k in range(1 - Ntheta, Ntheta)])
+    acf_two_sided = np.concatenate(
+        (np.zeros(Ntheta - 1), np.flip(acf[1:]), acf, np.zeros(width + Ntheta))
+    )
+    cov = np.correlate(acf_two_sided, q, mode="valid")[n_lags - 1 : n_lags - 1 + width]
 
-            if kind == "diag":
-                # V needs to be extended to cover Ntheta timesteps more into the past
-                sigma2_extended = np.append(sigma2[0] * np.ones((Ntheta - 1)), sigma2)
+    band = np.repeat(cov[:, np.newaxis], N, axis=1)
+    for d in range(1, width):
+        band[d, max(N - d, 0) :] = 0.0
 
-                # Ulow is to be sliced from V, see below
-                V = np.diag(sigma2_extended) #  this is not Ulow, same thing as in the case of a provided blow (see above)
+    return band
 
-            elif kind == "corr":
-                Ulow = toeplitz(trimOrPad(sigma2, Ntheta))
 
-        xlow = y
+def _fir_diag_band(sigma2_extended, Q, blow=None, conv_method="auto"):
+    """Band part of the output covariance for non-stationary white noise
 
-    # apply FIR filter to calculate best estimate in accordance with GUM
-    x, _ = lfilter(theta, 1.0, xlow, zi=xlow[0] * lfilter_zi(theta, 1.0))
-    x = np.roll(x, -int(shift))
+    Parameters
+    ----------
+        sigma2_extended: np.ndarray of shape (N + Ntheta + len(blow) - 2,)
+            see :func:`_fir_diag_uncertainty`
+        Q: np.ndarray of shape (Ntheta, Ntheta)
+            sum of theta theta^T and (the symmetric part of) Utheta
+        blow: np.ndarray, optional
+            optional FIR low-pass filter
+        conv_method: string, optional
+            how to evaluate convolutions, see :func:`FIRuncFilter`
 
-    # add dimension to theta, otherwise transpose won't work
-    if len(theta.shape) == 1:
-        theta = theta[:, np.newaxis]
+    Returns
+    -------
+        band: np.ndarray of shape (Ntheta + len(blow) - 1, N)
+            see :class:`FIRuncFilterCovariance`
+    """
+    if not isinstance(blow, np.ndarray):
+        blow = np.ones(1)
+    Ntheta = len(Q)
+    L = Ntheta + len(blow) - 1  # length of the combined filter
+    N = len(sigma2_extended) - L + 1
 
-    # NOTE: In the code below whereever `theta` or `Utheta` get used, they need to be flipped. 
-    #       This is necessary to take the time-order of both variables into account. (Which is descending
-    #       for `theta` and `Utheta` but ascending for `Ulow`.)
-    #       
-    #       Further details and illustrations showing the effect of not-flipping
-    #       can be found at https://github.com/PTB-PSt1/PyDynamic/issues/183
+    # as for _fir_diag_kernels, but with G[p1, p2] the weight of the variance of the
+    # input sample which precedes x[n] by p1 and x[m] by p2 samples, such that the
+    # covariance of x[n] and x[n + d] is a weighted sum of the variances
+    M = toeplitz(trimOrPad(blow, L), trimOrPad(blow[:1], Ntheta))
+    G = M.dot(Q).dot(M.T)
 
-    # handle diag-case, where Ulow needs to be sliced from V
-    if kind == "diag":
-        # UncCov needs to be calculated inside in its own for-loop
-        # V has dimension (len(sigma2) + Ntheta) * (len(sigma2) + Ntheta) --> slice a fitting Ulow of dimension (Ntheta x Ntheta)
-        UncCov = np.zeros((len(sigma2)))
+    band = np.zeros((L, N))
+    for d in range(min(L, N)):
+        g = np.zeros(L)
+        g[d:] = np.flip(np.diagonal(G, offset=d))
+        band[d] = _fir_valid(np.flip(g), sigma2_extended, conv_method)
+        band[d, N - d :] = 0.0
 
-        if isinstance(Utheta, np.ndarray):
-            for k in range(len(sigma2)):
-                Ulow = V[k:k+Ntheta,k:k+Ntheta]
-                UncCov[k] = np.squeeze(np.flip(theta).T.dot(Ulow.dot(np.flip(theta))) + np.abs(np.trace(Ulow.dot(np.flip(Utheta)))))  # static part of uncertainty
-        else:
-            for k in range(len(sigma2)):
-                Ulow = V[k:k+Ntheta,k:k+Ntheta]
-                UncCov[k] = np.squeeze(np.flip(theta).T.dot(Ulow.dot(np.flip(theta))))  # static part of uncertainty
+    return band
 
-    else:
-        if isinstance(Utheta, np.ndarray):
-            UncCov = np.flip(theta).T.dot(Ulow.dot(np.flip(theta))) + np.abs(np.trace(Ulow.dot(np.flip(Utheta))))      # static part of uncertainty
-        else:
-            UncCov = np.flip(theta).T.dot(Ulow.dot(np.flip(theta)))     # static part of uncertainty
 
+def _fir_diag_kernels(theta, Utheta=None, blow=None):
+    """Kernels for the uncertainty of non-stationary white noise (kind="diag")
+
+    Parameters
+    ----------
+        theta: np.ndarray
+            FIR filter coefficients
+        Utheta: np.ndarray, optional
+            covariance matrix associated with theta
+        blow: np.ndarray, optional
+            optional FIR low-pass filter
+
+    Returns
+    -------
+        g_theta: np.ndarray of shape (len(theta) + len(blow) - 1,)
+            kernel for the contribution of theta
+        g_Utheta: np.ndarray of shape (len(theta) + len(blow) - 1,) or None
+            kernel for the contribution of Utheta
+    """
+    # [Leeuw1994](Covariance matrix of ARMA errors in closed form) can be used, to derive this formula
+    # The given "blow" corresponds to a MA(q)-process.
+    # Going through the calculations of Leeuw, but assuming
+    # that E(vv^T) is a diagonal matrix with non-identical elements,
+    # the covariance matrix V becomes (see Leeuw:corollary1)
+    # V = M * S * M^T
+    # with M the Toeplitz matrix of blow and S = diag(sigma2_extended). Because S
+    # already covers the len(blow)-1 samples before the Ntheta-1 samples preceding
+    # the first output sample, the term N * SP * N^T of the paper is included.
+    #
+    # Instead of slicing Ulow = V[k:k+Ntheta, k:k+Ntheta] for every k, the
+    # quadratic forms of Ulow are written as weighted sums of the variances
+    #   flip(theta)^T Ulow flip(theta) = sum_r sigma2_extended[k + r] * g_theta[r]
+    #   trace(Ulow flip(Utheta))       = sum_r sigma2_extended[k + r] * g_Utheta[r]
+    # where g_theta are the squared taps of the combined filter theta * blow and
+    # g_Utheta[r] = B[r]^T flip(Utheta) B[r] with B[r] the part of blow that
+    # overlaps with flip(theta) for the offset r. This avoids V entirely and only
+    # needs memory linear in the signal length.
+    if not isinstance(blow, np.ndarray):
+        blow = np.ones(1)
+    Ntheta = len(theta)
+    L = Ntheta + len(blow) - 1  # length of the combined filter
+
+    g_theta = np.flip(np.convolve(theta, blow)) ** 2
+
+    g_Utheta = None
     if isinstance(Utheta, np.ndarray):
-        unc = np.empty_like(y)
+        B = toeplitz(trimOrPad(np.flip(blow), L), trimOrPad(blow[-1:], Ntheta))
+        g_Utheta = np.sum(B.dot(np.flip(Utheta)) * B, axis=1)
 
-        # use extended signal to match assumption of stationary signal prior to first entry
-        xlow_extended = np.append(np.full(Ntheta - 1, xlow[0]), xlow)
-        
-        for m in range(len(xlow)):
-            # extract necessary part from input signal
-            XL = xlow_extended[m : m + Ntheta, np.newaxis]
-            unc[m] = XL.T.dot(np.flip(Utheta).dot(XL))  # apply formula from paper
-    else:
-        unc = np.zeros_like(y)
-    
-    ux = np.sqrt(np.abs(UncCov + unc))
-    ux = np.roll(ux, -int(shift))  # correct for delay
+    return g_theta, g_Utheta
+
+
+def _fir_diag_uncertainty(sigma2_extended, g_theta, g_Utheta=None, conv_method="auto"):
+    """Static part of the uncertainty for non-stationary white noise (kind="diag")
+
+    Parameters
+    ----------
+        sigma2_extended: np.ndarray of shape (..., N + len(g_theta) - 1)
+            noise variances of the N output samples, preceded by the
+            ``len(theta) + len(blow) - 2`` variances of the samples before
+        g_theta, g_Utheta: np.ndarray
+            kernels as returned by :func:`_fir_diag_kernels`
+        conv_method: string, optional
+            how to evaluate convolutions, see :func:`FIRuncFilter`
+
+    Returns
+    -------
+        UncCov: np.ndarray of shape (..., N)
+            point-wise static part of the uncertainty
+    """
+    # the sums over r are correlations, i.e. convolutions with the flipped kernels
+    UncCov = _fir_valid(np.flip(g_theta), sigma2_extended, conv_method)  # static part of uncertainty
+    if isinstance(g_Utheta, np.ndarray):
+        UncCov += np.abs(_fir_valid(np.flip(g_Utheta), sigma2_extended, conv_method))
+
+    return UncCov
 
-    return x, ux.flatten()  # flatten in case that we still have 2D array
 
+def _factorize_Utheta(Utheta):
+    """Factorize Utheta for the evaluation of the quadratic form by convolutions
 
-def IIRuncFilter(x, noise, b, a, Uab):
+    The flipped symmetric part of Utheta is decomposed into
+    ``sum_k signs[k] * factors[:, k] * factors[:, k]^T`` by an eigendecomposition,
+    where eigenvalues which are numerically zero are dropped.
+
+    Parameters
+    ----------
+        Utheta: np.ndarray or None
+            covariance matrix associated with theta
+
+    Returns
+    -------
+        factors: np.ndarray of shape (Ntheta, K) or None
+            eigenvectors scaled by the square root of the absolute eigenvalues
+        signs: np.ndarray of shape (K,) or None
+            signs of the corresponding eigenvalues
+    """
+    if not isinstance(Utheta, np.ndarray):
+        return None
+
+    # x^T U x only depends on the symmetric part of U
+    w, v = np.linalg.eigh(0.5 * (Utheta + Utheta.T))
+    keep = np.abs(w) > len(w) * np.finfo(float).eps * np.max(np.abs(w), initial=0.0)
+
+    # the flip of Utheta corresponds to flipped eigenvectors, the additional flip for
+    # the convolution below cancels it out
+    factors = v[:, keep] * np.sqrt(np.abs(w[keep]))
+    signs = np.sign(w[keep])
+
+    return factors, signs
+
+
+def _fir_Utheta_term(xlow_extended, Utheta, Utheta_factors=None, conv_method="auto"):
+    """Point-wise uncertainty contribution xlow^T Utheta xlow of the uncertain filter
+
+    Parameters
+    ----------
+        xlow_extended: np.ndarray of shape (..., N + Ntheta - 1)
+            low-pass filtered signal, preceded by the Ntheta - 1 samples before
+        Utheta: np.ndarray
+            covariance matrix associated with theta
+        Utheta_factors: tuple of np.ndarray, optional
+            factorization of Utheta as returned by :func:`_factorize_Utheta`,
+            if None the quadratic form is evaluated sample by sample
+        conv_method: string, optional
+            how to evaluate convolutions, see :func:`FIRuncFilter`
+
+    Returns
+    -------
+        unc: np.ndarray of shape (..., N)
+    """
+    Ntheta = len(Utheta)
+    unc = np.zeros(xlow_extended.shape[:-1] + (xlow_extended.shape[-1] - Ntheta + 1,))
+
+    if Utheta_factors is None:
+        for m in range(unc.shape[-1]):
+            # extract necessary part from input signal
+            XL = xlow_extended[..., m : m + Ntheta]
+            unc[..., m] = np.sum(XL.dot(np.flip(Utheta)) * XL, axis=-1)  # apply formula from paper
+
+    elif not _use_fft(Ntheta, xlow_extended.shape[-1], conv_method):
+        # the quadratic form equals the weighted sum of the squared outputs of the
+        # FIR filters given by the factors
+        factors, signs = Utheta_factors
+        for factor, sign in zip(factors.T, signs):
+            unc += sign * _fir_valid(factor, xlow_extended, "direct") ** 2
+
+    else:
+        # same as above, but the factors are evaluated in groups by FFT-convolution
+        # while limiting the memory requirement
+        factors, signs = Utheta_factors
+        group_size = max(1, _MAX_BLOCK_ELEMENTS // xlow_extended.size)
+        for k in range(0, len(signs), group_size):
+            group = factors[:, k : k + group_size].T
+            xf = fftconvolve(
+                xlow_extended[..., np.newaxis, :],
+                group.reshape((1,) * (xlow_extended.ndim - 1) + group.shape),
+                mode="valid",
+                axes=-1,
+            )
+            unc += np.tensordot(signs[k : k + group_size], xf ** 2, axes=(0, -2))
+
+    return unc
+
+
+def _use_fft(n_taps, n_samples, conv_method):
+    """Decide whether to convolve by FFT instead of directly"""
+    if conv_method == "auto":
+        return n_taps >= _FFT_MIN_TAPS and n_samples >= n_taps
+    return conv_method == "fft"
+
+
+def _fir_valid(b, x_extended, conv_method="auto"):
+    """Apply FIR filter b to x_extended along its last axis
+
+    Only the ``x_extended.shape[-1] - len(b) + 1`` output samples which do not depend
+    on samples before x_extended are returned, i.e. the first ``len(b) - 1`` samples
+    of x_extended serve as initial condition of the filter.
+    """
+    if _use_fft(len(b), x_extended.shape[-1], conv_method):
+        b = np.reshape(b, (1,) * (x_extended.ndim - 1) + (-1,))
+        return oaconvolve(x_extended, b, mode="valid", axes=-1)
+    return lfilter(b, 1.0, x_extended, axis=-1)[..., len(b) - 1 :]
+
+
+def _len_or_one(b):
+    """Number of filter coefficients, where None represents no filter at all"""
+    return len(b) if isinstance(b, np.ndarray) else 1
+
+
+def _tail(array, length):
+    """Last `length` elements of array along its last axis (also for length == 0)"""
+    return array[..., array.shape[-1] - length :]
+
+
+def IIRuncFilter(
+    x,
+    noise,
+    b,
+    a,
+    Uab,
+    state=None,
+    return_state=False,
+    steady_state_tol=None,
+    phi=None,
+    theta=None,
+):
     """
     Uncertainty propagation for the signal x and the uncertain IIR filter (b,a)
 
+    A long signal can be processed in consecutive chunks by handing over the state
+    returned for the previous chunk, which yields the same result as processing
+    the whole signal at once.
+
+    Several channels sharing the same filter can be processed at once by providing
+    `x` of shape (channels, N). The propagation of the noise through the filter is
+    then carried out only once for all channels with a noise level constant in
+    time.
+
+    Instead of white noise, the noise can be an ARMA process as generated by
+    :func:`PyDynamic.misc.noise.ARMA`, which is taken into account by the
+    state-space model of the filter in series with the noise-shaping filter at
+    the same cost per sample.
+
     Parameters
     ----------
-    x: np.ndarray
+    x: np.ndarray of shape (N,) or (channels, N)
         filter input signal
-    noise: float
-        signal noise standard deviation
+    noise: float or np.ndarray
+        signal noise standard deviation, either for all samples (float) or
+        point-wise (shape (N,)), for x of shape (channels, N) also channel-wise of
+        shape (channels, 1) or (channels, N)
     b: np.ndarray
         filter numerator coefficients
     a: np.ndarray
         filter denominator coefficients
     Uab: np.ndarray
         covariance matrix for (a[1:],b)
+    state: dict, optional
+        state after the previous chunk of the signal as returned for
+        ``return_state=True``, holding the filter state "z", its derivatives
+        "dz" w.r.t. a[1:] and its covariance "P" due to the noise, defaults to
+        the filter at rest
+    return_state: bool, optional
+        if True, additionally return the state after the last sample of x
+        (defaults to False)
+    steady_state_tol: float, optional
+        if given and the filter is stable, the noise more than L samples before
+        a sample is treated as being in steady state, i.e. the impulse response
+        of the filter is truncated after L samples. L is the first power of two,
+        after which the state covariance due to constant noise from rest
+        deviates from its steady state, the solution of the discrete Lyapunov
+        equation, by at most steady_state_tol relative to the steady state
+        (defaults to None, i.e. the impulse response is used until it has
+        decayed below numerical resolution)
+    phi: float, list or np.ndarray, optional
+        AR-coefficients of the noise, noise is then the standard deviation of
+        the white noise fed into the ARMA-process (defaults to None, i.e. white
+        noise)
+    theta: float, list or np.ndarray, optional
+        MA-coefficients of the noise (defaults to None, i.e. white noise)
 
     Returns
     -------
-    y: np.ndarray
+    y: np.ndarray of the same shape as x
         filter output signal
-    Uy: np.ndarray
+    Uy: np.ndarray of the same shape as x
         uncertainty associated with y
+    state: dict
+        state after the last sample of x, only returned if return_state is True
 
     References
     ----------
@@ -247,8 +1121,15 @@ def IIRuncFilter(x, noise, b, a, Uab):
 
     """
 
-    if not isinstance(noise, np.ndarray):
-        noise = noise * np.ones_like(x)  # translate iid noise to vector
+    if x.ndim not in (1, 2) or np.ndim(noise) > x.ndim:
+        raise ValueError(
+            f"IIRuncFilter: Input signal x is expected to be of shape (N,) or "
+            f"(channels, N) and noise may only be two-dimensional in the latter "
+            f"case, but shapes {x.shape} and {np.shape(noise)} are given."
+        )
+
+    # noise variances of shape (1,), (N,), (channels, 1) or (channels, N)
+    noise2 = np.asarray(noise, dtype=float).reshape(np.shape(noise) or (1,)) ** 2
 
     p = len(a) - 1
 
@@ -258,37 +1139,376 @@ def IIRuncFilter(x, noise, b, a, Uab):
 
     # From discrete-time transfer function to state space representation.
     [A, bs, c, b0] = tf2ss(b, a)
+    bs = bs.ravel()
+    c = c.ravel()
+
+    # state-space representation of the filter in series with the filter shaping
+    # the white noise, whose state covariance P is propagated
+    if phi is None and theta is None:
+        A_noise, bs_noise, c_noise, b0_noise, a_noise = A, bs, c, b0, a
+    else:
+        b_noise = np.convolve(b, np.append(1.0, _as_coefficients(theta)))
+        a_noise = np.convolve(a, np.append(1.0, -_as_coefficients(phi)))
+        # both polynomials in z^-1 of the same length, as tf2ss would pad in front
+        length = max(len(b_noise), len(a_noise))
+        b_noise = trimOrPad(b_noise, length)
+        a_noise = trimOrPad(a_noise, length)
+        A_noise, bs_noise, c_noise, b0_noise = tf2ss(b_noise, a_noise)
+        bs_noise = bs_noise.ravel()
+        c_noise = c_noise.ravel()
+
+    if state is None:  # filter at rest
+        state = {
+            "z": np.zeros(x.shape[:-1] + (p,)),
+            "dz": np.zeros(x.shape[:-1] + (p, p)),
+            "P": np.zeros_like(A_noise),
+        }
+
+    # The states of the controllable canonical form are the last p samples of
+    # u = x / a and their derivatives w.r.t. a[1:] are the (negative) samples of
+    # w = u / a before. Thus the sensitivities of y w.r.t. the filter coefficients
+    # are delayed versions of u and v = b * w, which is also the way the
+    # derivative states dz of the paper evolve for all a_k at once. All channels
+    # are filtered at once along the last axis.
+    u_history, w_history = _iir_history(state, a)
+    u = lfilter(np.ones(1), a, x, zi=_iir_zi(a, state["z"]))[0]
+    w = lfilter(np.ones(1), a, u, zi=_iir_zi(a, np.flip(w_history, axis=-1)))[0]
+    u_extended = np.concatenate((u_history, u), axis=-1)
+    w_extended = np.concatenate((w_history, w), axis=-1)
+    y = _fir_valid(b, u_extended, "direct")
+    v_extended = _fir_valid(b, w_extended, "direct")
+
+    if x.ndim == 1:
+        Uy = _iir_phi_term(u_extended, v_extended, p, Uab)
+    else:
+        Uy = np.array(
+            [_iir_phi_term(uc, vc, p, Uab) for uc, vc in zip(u_extended, v_extended)]
+        )
+
+    # the noise propagated by the impulse response of the filter, computed only
+    # once for all channels with a noise level constant in time
+    noise_term, P = _iir_noise_term(
+        A_noise,
+        bs_noise,
+        c_noise,
+        b0_noise.item(),
+        a_noise,
+        noise2,
+        state["P"],
+        x.shape[-1],
+        steady_state_tol,
+    )
+    Uy = Uy + noise_term
+
+    Uy = np.sqrt(np.abs(Uy))  # calculate point-wise standard uncertainties
+
+    if not return_state:
+        return y, Uy
+
+    # dz[j, k] = -w[n - 2 - j - k] for the first sample n after x
+    w_reversed = np.flip(_tail(w_extended, 2 * p)[..., :-1], axis=-1)
+    state = {
+        "z": np.flip(_tail(u_extended, p), axis=-1),
+        "dz": -w_reversed[..., np.add.outer(np.arange(p), np.arange(p))],
+        "P": P,
+    }
+
+    return y, Uy, state
+
+
+def _as_coefficients(coefficients):
+    """Coefficients as np.ndarray, where None represents no coefficients at all"""
+    if coefficients is None:
+        return np.zeros(0)
+    return np.atleast_1d(np.asarray(coefficients, dtype=float))
+
+
+def _iir_history(state, a):
+    """Samples of u and w before the current chunk as given by the state
+
+    Parameters
+    ----------
+        state: dict
+            see :func:`IIRuncFilter`
+        a: np.ndarray
+            filter denominator coefficients
+
+    Returns
+    -------
+        u_history: np.ndarray of shape (..., p)
+            the last p samples of u = x / a in chronological order
+        w_history: np.ndarray of shape (..., 2p)
+            the last 2p samples of w = u / a in chronological order
+    """
+    z, dz = state["z"], state["dz"]
+    p = z.shape[-1]
+    if p == 0:
+        return np.zeros(z.shape), np.zeros(z.shape)
+
+    # dz holds the samples w[n - 2], ..., w[n - 2p] along its first row and last
+    # column, the latest sample w[n - 1] follows from the difference equation
+    w_reversed = -np.concatenate((dz[..., 0, :], dz[..., 1:, -1]), axis=-1)
+    w_latest = (z[..., :1] - w_reversed[..., :p].dot(a[1:])[..., np.newaxis]) / a[0]
+    w_history = np.concatenate((np.flip(w_reversed, axis=-1), w_latest), axis=-1)
+
+    return np.flip(z, axis=-1), w_history
+
+
+def _iir_zi(a, y_past):
+    """Initial condition of lfilter(1, a, ...) from the past output samples
 
-    A = np.matrix(A)
-    bs = np.matrix(bs)
-    c = np.matrix(c)
-
-    phi = np.zeros((2 * p + 1, 1))
-    dz = np.zeros((p, p))
-    dz1 = np.zeros((p, p))
-    z = np.zeros((p, 1))
-    P = np.zeros((p, p))
-
-    y = np.zeros((len(x),))
-    Uy = np.zeros((len(x),))
-
-    Aabl = np.zeros((p, p, p))
-    for k in range(p):
-        Aabl[0, k, k] = -1
-
-    # implementation of the state-space formulas from the paper
-    for n in range(len(y)):
-        for k in range(p):  # derivative w.r.t. a_1,...,a_p
-            dz1[:, k] = A * dz[:, k] + np.squeeze(Aabl[:, :, k]) * z
-            phi[k] = c * dz[:, k] - b0 * z[k]
-        phi[p + 1] = -np.matrix(a[1:]) * z + x[n]  # derivative w.r.t. b_0
-        for k in range(p + 2, 2 * p + 1):  # derivative w.r.t. b_1,...,b_p
-            phi[k] = z[k - (p + 1)]
-        P = A * P * A.T + noise[n] ** 2 * (bs * bs.T)
-        y[n] = c * z + b0 * x[n]
-        Uy[n] = phi.T * Uab * phi + c * P * c.T + b[0] ** 2 * noise[n] ** 2
-        z = A * z + bs * x[n]  # update of the state equations
-        dz = dz1
+    Same as :func:`scipy.signal.lfiltic` applied along the last axis of
+    ``y_past = [y[-1], y[-2], ...]``, of which the first len(a) - 1 samples are
+    used.
+    """
+    p = len(a) - 1
+    # zi[m] = -sum_{k > m} a[k] * y[m - k]
+    T = np.zeros((p, p))
+    for m in range(p):
+        T[: p - m, m] = -a[m + 1 :]
+
+    return y_past[..., :p].dot(T)
+
+
+def _iir_phi_term(u_extended, v_extended, p, Uab):
+    """Point-wise uncertainty contribution phi^T Uab phi of the filter coefficients
+
+    Parameters
+    ----------
+        u_extended: np.ndarray of shape (N + p,) or (n_filters, N + p)
+            filter input signal filtered by 1 / a, preceded by the p samples before
+        v_extended: np.ndarray of shape (N + p,) or (n_filters, N + p)
+            u filtered by b / a, preceded by the p samples before
+        p: int
+            filter order
+        Uab: np.ndarray of shape (n_filters * (2p + 1), n_filters * (2p + 1))
+            covariance matrix for (a[1:],b) (of all filters one after another)
+
+    Returns
+    -------
+        np.ndarray of shape (N,)
+    """
+    u_extended = np.atleast_2d(u_extended)
+    v_extended = np.atleast_2d(v_extended)
+    N = u_extended.shape[-1] - p
+    # phi[n] = [-v[n-1], ..., -v[n-p], u[n], u[n-1], ..., u[n-p]] (for each filter),
+    # evaluated blockwise to limit the memory requirement
+    lags_a = p - 1 - np.arange(p)
+    lags_b = p - np.arange(p + 1)
+
+    unc = np.zeros(N)
+    block_size = max(1, _MAX_BLOCK_ELEMENTS // len(Uab))
+    for n0 in range(0, N, block_size):
+        n = np.arange(n0, min(n0 + block_size, N))[:, np.newaxis]
+        phi = np.hstack(
+            [
+                np.hstack((-v[n + lags_a], u[n + lags_b]))
+                for u, v in zip(u_extended, v_extended)
+            ]
+        )
+        unc[n0 : n0 + len(n)] = np.sum(phi.dot(Uab) * phi, axis=1)
+
+    return unc
+
+
+def _iir_noise_term(A, bs, c, b0, a, noise2, P, N, steady_state_tol=None):
+    """Point-wise contribution of the white noise and the state covariance P
+
+    The state covariance P before the first sample is propagated freely, i.e.
+    contributes c A^n P (A^n)^T c^T to sample n, and the white noise contributes
+    its variances convolved with the squared impulse response h of the filter,
+    where h[0] = b0 and h[n] = c A^(n-1) bs.
+
+    Parameters
+    ----------
+        A, bs, c, b0: np.ndarray
+            state-space matrices of the filter as returned by
+            :func:`scipy.signal.tf2ss` with bs and c flattened
+        a: np.ndarray
+            filter denominator coefficients, the characteristic polynomial of A
+        noise2: np.ndarray of shape (..., N) or (..., 1)
+            point-wise variances of the white noise or its variance for all
+            samples (of several channels)
+        P: np.ndarray of shape (..., p, p)
+            state covariance before the first sample
+        N: int
+            number of samples
+        steady_state_tol: float, optional
+            relative tolerance for the switch-over to the steady state, see
+            :func:`IIRuncFilter`
+
+    Returns
+    -------
+        unc: np.ndarray of shape (..., N)
+        P: np.ndarray of shape (..., p, p)
+            state covariance after the last sample
+    """
+    a = a / a[0]
+    # noise more than L samples before is treated as being in steady state
+    L = _iir_steady_state_length(A, bs, N, steady_state_tol)
+    # the rows A^n bs for n = 0, ..., L - 1
+    S = _iir_state_sequence(A, bs, a, L)
+    h2 = np.zeros(N)
+    h2[0] = b0 ** 2
+    h2[1:L] = S[: L - 1].dot(c) ** 2
+
+    if noise2.shape[-1] == 1:
+        unc = noise2 * np.cumsum(h2)
+        P_next = noise2[..., np.newaxis] * S.T.dot(S)
+    else:
+        h2 = h2[:L].reshape((1,) * (noise2.ndim - 1) + (L,))
+        unc = fftconvolve(noise2, h2, axes=-1)[..., :N]
+        S_reversed = S[::-1]
+        P_next = np.matmul(
+            np.swapaxes(S_reversed * noise2[..., N - L :, np.newaxis], -1, -2),
+            S_reversed,
+        )
+
+    if np.any(P):
+        # the rows c A^n for n = 0, ..., L - 1
+        G = _iir_state_sequence(A.T, c, a, L)
+        unc = unc + np.pad(
+            np.einsum("np,...pq,nq->...n", G, P, G), [(0, 0)] * (P.ndim - 2) + [(0, N - L)]
+        )
+        A_N = np.linalg.matrix_power(A, N)
+        P_next = P_next + np.matmul(np.matmul(A_N, P), A_N.T)
+
+    return unc, P_next
+
+
+def _iir_steady_state_length(A, bs, N, steady_state_tol=None):
+    """Number of samples after which the state covariance is in steady state
+
+    For unit noise from rest, the state covariance P_n = A P_(n-1) A^T + bs bs^T
+    deviates from its steady state P, the solution of the discrete Lyapunov
+    equation, by A^n P (A^n)^T. This deviation is checked for n = 1, 2, 4, ...
+    only, such that at most log2(N) checks are carried out.
+
+    Returns
+    -------
+        L: int
+            the first checked n with a deviation of at most steady_state_tol
+            relative to P, or N if there is none or no tolerance is given
+    """
+    if (
+        steady_state_tol is None
+        or len(bs) == 0
+        or np.any(np.abs(np.linalg.eigvals(A)) >= 1)
+    ):
+        return N
+    P = solve_discrete_lyapunov(A, np.outer(bs, bs))
+    threshold = steady_state_tol * np.max(np.abs(P))
+    n, A_n = 1, A
+    while n < N:
+        if np.max(np.abs(A_n.dot(P).dot(A_n.T))) <= threshold:
+            return n
+        n, A_n = 2 * n, A_n.dot(A_n)
+    return N
+
+
+def _iir_state_sequence(A, v, a, N):
+    """The vectors A^n v for n = 0, ..., N - 1 as rows
+
+    By the theorem of Cayley-Hamilton, the sequence follows the recursion given
+    by the characteristic polynomial a of A, such that all but the first p rows
+    are obtained by filtering. This is done in chunks of growing length, until
+    the sequence has decayed below the resolution of its largest value (and
+    before it would reach subnormal numbers, which are slow to compute with).
+    """
+    p = len(v)
+    V = np.zeros((N, p))
+    for n in range(min(p, N)):
+        V[n] = v
+        v = A.dot(v)
+    if p == 0 or N <= p:
+        return V
+
+    zi = _iir_zi(a, np.flip(V[:p].T, axis=-1))
+    scale = np.max(np.abs(V[:p]))
+    n, length = p, 1024
+    while n < N and scale > 0:
+        chunk, zi = lfilter(np.ones(1), a, np.zeros((p, min(length, N - n))), zi=zi)
+        V[n : n + chunk.shape[1]] = chunk.T
+        n += chunk.shape[1]
+        length *= 2
+        chunk_max = np.max(np.abs(chunk))
+        if chunk_max <= _DECAYED * scale:
+            break
+        scale = max(scale, chunk_max)
+    return V
+
+
+def SOSuncFilter(x, noise, sos, Usos):
+    """
+    Uncertainty propagation for the signal x and the uncertain IIR filter given
+    as cascade of second-order sections sos
+
+    Compared to :func:`IIRuncFilter` with the coefficients (b,a) of the whole
+    filter, the sections are applied one after another, which is numerically
+    stable also for filters of high order. The sensitivities of the output
+    w.r.t. the coefficients of each section are evaluated by filtering as well.
+
+    Parameters
+    ----------
+    x: np.ndarray
+        filter input signal
+    noise: float or np.ndarray
+        signal noise standard deviation, either for all samples or point-wise
+    sos: np.ndarray of shape (n_sections, 6)
+        second-order sections [b0, b1, b2, a0, a1, a2] with a0 = 1 as used by
+        :func:`scipy.signal.sosfilt`
+    Usos: np.ndarray of shape (5 * n_sections, 5 * n_sections)
+        covariance matrix for (a1, a2, b0, b1, b2) of the first section, followed
+        by the ones of the other sections in the same order
+
+    Returns
+    -------
+    y: np.ndarray
+        filter output signal
+    Uy: np.ndarray
+        uncertainty associated with y
+
+    References
+    ----------
+        * Link and Elster [Link2009]_
+
+    .. seealso:: :func:`IIRuncFilter`
+
+    """
+
+    if not isinstance(noise, np.ndarray):
+        noise = noise * np.ones_like(x)  # translate iid noise to vector
+
+    sos = np.atleast_2d(sos)
+    n_sections = len(sos)
+
+    # The sensitivities of the output of a section w.r.t. its coefficients are
+    # delayed versions of u = input / a and w = output / a of the section (see
+    # IIRuncFilter). The ones of the final output result from filtering them by
+    # all following sections, which is done for all pending sections at once.
+    u = np.zeros((n_sections, len(x)))
+    w = np.zeros((n_sections, len(x)))
+    y = x
+    for k, section in enumerate(sos):
+        b, a = section[:3], section[3:]
+        if k > 0:
+            u[:k] = lfilter(b, a, u[:k], axis=-1)
+            w[:k] = lfilter(b, a, w[:k], axis=-1)
+        u[k] = lfilter(np.ones(1), a, y)
+        y = lfilter(b, a, y)
+        w[k] = lfilter(np.ones(1), a, y)
+
+    # filter is at rest before the first sample
+    u_extended = np.pad(u, ((0, 0), (2, 0)))
+    w_extended = np.pad(w, ((0, 0), (2, 0)))
+    Uy = _iir_phi_term(u_extended, w_extended, 2, Usos)
+
+    # white noise propagated by the impulse response of the whole filter
+    impulse_response = sosfilt(sos, np.eye(1, len(x))[0])
+    if np.all(noise == noise[0]):
+        Uy += noise[0] ** 2 * np.cumsum(impulse_response ** 2)
+    else:
+        Uy += fftconvolve(noise ** 2, impulse_response ** 2)[: len(x)]
 
     Uy = np.sqrt(np.abs(Uy))  # calculate point-wise standard uncertainties
 
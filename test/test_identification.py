@@ -4,9 +4,13 @@ Perform tests on identification sub-packages.
 
 """
 
+import warnings
+
 import numpy as np
+import pytest
 
 from PyDynamic.identification import fit_filter
+from PyDynamic.model_estimation import fit_filter as model_fit_filter
 from PyDynamic.misc.SecondOrderSystem import sos_FreqResp
 
 
@@ -30,3 +34,29 @@ def test_LSIIR():
     assert len(b) == Nb + 1
     assert len(a) == Na + 1
     assert isinstance(tau, int)
+
+
+@pytest.mark.parametrize("n_unstable", [0, 250, 1000])
+def test_invLSIIR_unc_unstable(monkeypatch, n_unstable):
+    # unstable fits are left out of the mean and covariance, unless all are unstable
+    fits = iter(
+        [(np.array([2.0]), np.array([1.0, -2.0]), 3)] * n_unstable
+        + [(np.array([1.0]), np.array([1.0, -0.5]), 1)] * (1000 - n_unstable)
+    )
+    monkeypatch.setattr(model_fit_filter, "invLSIIR", lambda *args, **kwargs: next(fits))
+    f = np.linspace(0, 1e3, 5)
+    H, UH = np.ones_like(f, dtype=complex), 1e-4 * np.eye(2 * len(f))
+
+    if n_unstable == 0:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", RuntimeWarning)
+            b, a, tau, Uab = model_fit_filter.invLSIIR_unc(H, UH, 0, 1, f, 1e4)
+    else:
+        with pytest.warns(RuntimeWarning, match="not stable|None of"):
+            b, a, tau, Uab = model_fit_filter.invLSIIR_unc(H, UH, 0, 1, f, 1e4)
+    if n_unstable == 1000:
+        assert np.allclose(a, [1.0, -2.0]) and np.allclose(b, [2.0]) and tau == 3
+    else:
+        # the mixed case only keeps the stable fits
+        assert np.allclose(a, [1.0, -0.5]) and np.allclose(b, [1.0]) and tau == 1
+    assert np.allclose(Uab, 0.0)
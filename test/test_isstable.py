@@ -2,8 +2,9 @@
 """ Perform tests on *misc.filterstuff.isstable*."""
 
 import numpy as np
+import pytest
 
-from PyDynamic.misc.filterstuff import isstable
+from PyDynamic.misc.filterstuff import isstable, isstable_batch
 
 
 def test_stable():
@@ -18,3 +19,19 @@ def test_not_stable():
     b = np.array([1, 1])
     a = np.array([-0.999999999, 1])
     assert not isstable(b, a)
+
+
+def test_isstable_batch():
+    # the batched test agrees with the test of each filter on its own
+    rng = np.random.default_rng(1)
+    a = np.hstack((np.ones((200, 1)), rng.normal(scale=0.7, size=(200, 4))))
+    stable = isstable_batch(a)
+    assert stable.shape == (200,)
+    assert 0 < np.count_nonzero(stable) < 200
+    for ftype in ["digital", "analog"]:
+        assert np.array_equal(
+            isstable_batch(a, ftype=ftype), [isstable(1.0, ak, ftype) for ak in a]
+        )
+    assert np.all(isstable_batch(np.ones((3, 1))))
+    with pytest.raises(ValueError):
+        isstable_batch(a, ftype="foo")
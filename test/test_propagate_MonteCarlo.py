@@ -4,13 +4,18 @@
 import numpy as np
 from pytest import raises
 import functools
+from concurrent.futures import ThreadPoolExecutor
 import scipy
+import scipy.signal
+import scipy.linalg
+import scipy.stats
 
 from PyDynamic.misc.testsignals import rect
 from PyDynamic.misc.tools import make_semiposdef
-from PyDynamic.misc.filterstuff import kaiser_lowpass
+from PyDynamic.misc.filterstuff import isstable_batch, kaiser_lowpass
 #from PyDynamic.misc.noise import power_law_acf, power_law_noise, white_gaussian, ARMA
-from PyDynamic.uncertainty.propagate_MonteCarlo import MC, SMC, UMC, ARMA, UMC_generic, _UMCevaluate
+import PyDynamic.uncertainty.propagate_MonteCarlo as propagate_MonteCarlo
+from PyDynamic.uncertainty.propagate_MonteCarlo import MC, SMC, UMC, ARMA, UMC_generic, _UMCevaluate, _UMCdraw, _SMCstate, _SMCstep, _quantiles, _histograms, Normal_Correlated
 
 import matplotlib.pyplot as plt
 
@@ -72,13 +77,188 @@ def test_MC(visualizeOutput=False):
         plt.show()
 
 
-# this does not run through yet
-#def test_SMC():
-#    # run method
-#    y,Uy = SMC(x, sigma_noise, b1, [1.0], Ub, runs=runs)
-#
-#    assert len(y) == len(x)
-#    assert Uy.shape == (x.size, x.size)
+def test_MC_blocksize():
+    # the same random numbers are drawn, no matter how many runs are processed at once
+    bb, aa = scipy.signal.butter(3, 0.3)
+    Uab = np.eye(7) * 1e-6
+    for args in [(x, sigma_noise, b1, [1.0], Ub), (x, sigma_noise, bb, aa, Uab),
+                 (x, sigma_noise, bb, aa, np.zeros_like(Uab))]:
+        results = []
+        for blocksize in [1, 7, None]:
+            np.random.seed(12345)
+            results.append(MC(*args, runs=runs, blow=b2, blocksize=blocksize, verbose=False))
+        for y, Uy in results[1:]:
+            assert np.allclose(y, results[0][0])
+            assert np.allclose(Uy, results[0][1])
+
+
+
+def test_MC_covariance():
+    # reduced covariance representations agree with the full covariance matrix
+    N = len(x)
+    results = {}
+    for covariance in ["full", "diag", 3]:
+        np.random.seed(12345)
+        results[covariance] = MC(x, sigma_noise, b1, [1.0], Ub, runs=runs, blow=b2,
+                                 blocksize=7, covariance=covariance, verbose=False)
+    y, Uy = results["full"]
+    assert np.allclose(results["diag"][0], y)
+    assert np.allclose(results["diag"][1], np.diag(Uy))
+    assert results[3][1].shape == (4, N)
+    for d in range(4):
+        assert np.allclose(results[3][1][d, :N - d], np.diag(Uy, d))
+
+    # the accumulated moments equal the sample moments of all runs
+    np.random.seed(12345)
+    Y = MC(x, sigma_noise, b1, [1.0], Ub, runs=runs, blow=b2, return_samples=True,
+           verbose=False)
+    assert np.allclose(y, np.mean(Y, axis=0))
+    assert np.allclose(Uy, np.cov(Y, rowvar=False))
+
+    with raises(ValueError):
+        MC(x, sigma_noise, b1, [1.0], Ub, runs=runs, covariance="band", verbose=False)
+
+
+def test_MC_workers():
+    # for a given seed the result does not depend on how the runs are distributed
+    results = []
+    for n_workers in [None, 1, 2]:
+        results.append(MC(x, sigma_noise, b1, [1.0], Ub, runs=runs, blow=b2, blocksize=7,
+                          n_workers=n_workers, seed=1, verbose=False))
+    with ThreadPoolExecutor(2) as executor:
+        results.append(MC(x, sigma_noise, b1, [1.0], Ub, runs=runs, blow=b2, blocksize=7,
+                          executor=executor, seed=1, verbose=False))
+    for y, Uy in results[1:]:
+        assert np.array_equal(y, results[0][0])
+        assert np.array_equal(Uy, results[0][1])
+
+    # the default blocksize does not depend on the number of workers either
+    y, Uy = MC(x, sigma_noise, b1, [1.0], Ub, runs=runs, blow=b2, n_workers=2, seed=7,
+               verbose=False)
+    y_ref, Uy_ref = MC(x, sigma_noise, b1, [1.0], Ub, runs=runs, blow=b2, n_workers=4,
+                       seed=7, verbose=False)
+    assert np.array_equal(y, y_ref)
+    assert np.array_equal(Uy, Uy_ref)
+
+
+def test_MC_correlated_noise():
+    # stationary, banded and general covariance matrices of the input noise
+    N = 20
+    Ux_stationary = scipy.linalg.toeplitz(0.9 ** np.arange(N))
+    Ux_banded = 2 * np.eye(N) + 0.5 * np.eye(N, k=1) + 0.5 * np.eye(N, k=-1)
+    Ux_banded[3, 3] = 3.0
+    A = np.random.randn(N, 5)
+    Ux_singular = A.dot(A.T)
+    for Ux, method in [(Ux_stationary, "circulant"), (Ux_banded, "banded"),
+                       (Ux_singular, "dense")]:
+        dist = Normal_Correlated(np.ones(N), Ux)
+        assert dist.method == method
+        X = dist.rvs(size=100001, random_state=np.random.RandomState(1))
+        assert X.shape == (100001, N)
+        assert np.allclose(np.mean(X, axis=0), 1, atol=0.05)
+        assert np.allclose(np.cov(X, rowvar=False), Ux, atol=0.1)
+        assert dist.rvs(size=1).shape == (1, N)
+
+    y, Uy = MC(x[:N], Ux_stationary * sigma_noise ** 2, b1, [1.0], Ub, runs=runs,
+               verbose=False)
+    assert len(y) == N
+    assert Uy.shape == (N, N)
+
+
+def test_SMC():
+    # run method
+    y, Uy, P = SMC(x, sigma_noise, b1, [1.0], Ub, runs=runs, blow=b2, Perc=[0.025, 0.975])
+
+    assert len(y) == len(x)
+    assert Uy.shape == x.shape
+    assert P.shape == (2, len(x))
+    assert np.all(P[0] <= P[1])
+
+
+def test_SMC_noise_model():
+    # without uncertainty of the filter each run is the filtered noisy signal
+    ba, aa = scipy.signal.butter(3, 0.3)
+    phi, theta = np.array([0.5]), np.array([0.3, 0.1])
+    Y = SMC(x, sigma_noise, ba, aa, None, runs=5, blow=b2, phi=phi, theta=theta, seed=3,
+            return_samples=True)
+    rng = np.random.default_rng(np.random.SeedSequence(3).spawn(1)[0])
+    w = rng.standard_normal((len(x), 5)).T * sigma_noise
+    noise = scipy.signal.lfilter(np.hstack((1.0, theta)), np.hstack((1.0, -phi)), w, axis=1)
+    Y_ref = scipy.signal.lfilter(ba, aa, scipy.signal.lfilter(b2, 1.0, x + noise, axis=1), axis=1)
+    assert np.allclose(Y, Y_ref, atol=1e-14)
+
+
+def test_SMC_windows():
+    # simulating the runs window by window equals simulating all samples at once
+    ba, aa = scipy.signal.butter(3, 0.3)
+    phi, theta = np.array([0.5]), np.array([0.3, 0.1])
+    kwargs = dict(Na=3, blow=b2, alow=None, phi=phi, theta=theta)
+    coefs = np.hstack((aa[1:], ba))
+    results = []
+    for windows in [[len(x)], [3, 5, len(x) - 8]]:
+        state = _SMCstate(runs, coefs, np.eye(7) * 1e-8, random_state=np.random.RandomState(1),
+                          **kwargs)
+        Y, start = [], 0
+        for window in windows:
+            Yw, state = _SMCstep(state, x[start:start + window], noise_std=sigma_noise,
+                                 Delta=0.0, **kwargs)
+            Y.append(Yw)
+            start += window
+        results.append(np.hstack(Y))
+    assert np.allclose(results[1], results[0], atol=1e-14)
+
+
+def test_SMC_quantiles():
+    # the quantiles of all columns agree with those of mquantiles column by column
+    Perc = [0.0, 0.025, 0.5, 0.975, 1.0]
+    for n in [1, 2, runs]:
+        Y = np.random.randn(n, 11)
+        Q = np.array([scipy.stats.mstats.mquantiles(Y[:, k], prob=Perc) for k in range(11)]).T
+        assert np.allclose(_quantiles(Y, Perc), Q)
+
+
+class _InterruptedMap:
+    # executor which fails after the given number of calls of map
+    def __init__(self, calls):
+        self.calls = calls
+
+    def map(self, func, iterable):
+        if self.calls == 0:
+            raise KeyboardInterrupt
+        self.calls -= 1
+        return map(func, iterable)
+
+
+def test_SMC_checkpoint(tmp_path, monkeypatch):
+    # a resumed simulation gives the same results as an uninterrupted one
+    monkeypatch.setattr(propagate_MonteCarlo, "_MAX_BLOCK_ELEMENTS", 50 * runs)
+    ba, aa = scipy.signal.butter(3, 0.3)
+    checkpoint = str(tmp_path / "smc.npz")
+    kwargs = dict(runs=runs, blow=b2, Perc=[0.025, 0.975], blocksize=7, seed=1,
+                  checkpoint=checkpoint, checkpoint_interval=0)
+    expected = SMC(x, sigma_noise, ba, aa, np.eye(7) * 1e-8, **kwargs)
+    with raises(KeyboardInterrupt):
+        SMC(x, sigma_noise, ba, aa, np.eye(7) * 1e-8, executor=_InterruptedMap(4), **kwargs)
+    result = SMC(x, sigma_noise, ba, aa, np.eye(7) * 1e-8, resume_from=checkpoint, **kwargs)
+    for actual, desired in zip(result, expected):
+        assert np.array_equal(actual, desired)
+
+    with raises(ValueError):
+        SMC(x, sigma_noise, ba, aa, np.eye(7) * 1e-8, resume_from=checkpoint,
+            **dict(kwargs, runs=runs + 1))
+
+
+def test_SMC_workers():
+    # for a given seed the result does not depend on how the runs are distributed
+    ba, aa = scipy.signal.butter(3, 0.3)
+    kwargs = dict(runs=runs, blow=b2, Perc=[0.025, 0.975], blocksize=7, seed=1)
+    results = [SMC(x, sigma_noise, ba, aa, np.eye(7) * 1e-8, n_workers=n_workers, **kwargs)
+               for n_workers in [None, 2]]
+    with ThreadPoolExecutor(2) as executor:
+        results.append(SMC(x, sigma_noise, ba, aa, np.eye(7) * 1e-8, executor=executor, **kwargs))
+    for result in results[1:]:
+        for actual, expected in zip(result, results[0]):
+            assert np.array_equal(actual, expected)
 
 
 def test_UMC(visualizeOutput=False):
@@ -90,6 +270,7 @@ def test_UMC(visualizeOutput=False):
     assert p025.shape[1] == len(x)
     assert p975.shape[1] == len(x)
     assert isinstance(happr, dict)
+    assert list(happr.keys()) == [10]
 
     if visualizeOutput:
         # visualize input and mean of system response
@@ -112,6 +293,15 @@ def test_UMC(visualizeOutput=False):
         plt.show()
 
 
+def test_UMC_stable_draws():
+    # draws of unstable filters are replaced
+    ba, aa = scipy.signal.butter(2, 0.01)
+    ab = np.hstack((aa[1:], ba))
+    samples = _UMCdraw(50, ab, np.eye(5) * 1e-4, len(aa))
+    assert samples.shape == (50, 5)
+    assert np.all(isstable_batch(np.hstack((np.ones((50, 1)), samples[:, :2]))))
+
+
 def test_UMC_generic(visualizeOutput=False):
 
     x_shape = (5,6,7)
@@ -143,6 +333,127 @@ def test_UMC_generic(visualizeOutput=False):
     assert sims["results"][0].shape == output_shape
 
 
+def test_UMC_generic_moments():
+    # the block-wise updates give the mean and covariance of all simulations,
+    # also if the last block is incomplete
+    draw_samples = lambda size: np.random.rand(size, 3, 4)
+    evaluate = functools.partial(np.mean, axis=1)
+    y, Uy, _, _, sims = UMC_generic(draw_samples, evaluate, runs=95, blocksize=20,
+                                    runs_init=10, return_samples=True, n_cpu=1)
+    Y = sims["results"].reshape(95, -1)
+    assert len(sims["samples"]) == 95
+    assert np.allclose(y, np.mean(Y, axis=0))
+    assert np.allclose(Uy, np.cov(Y, rowvar=False))
+
+
+def test_UMC_generic_vectorized():
+    # evaluating blocks of samples at once gives the same results as one by one
+    draw_samples = lambda size: np.random.rand(size, 3, 4)
+    kwargs = dict(runs=95, blocksize=20, runs_init=10, return_samples=True)
+    np.random.seed(1)
+    expected = UMC_generic(draw_samples, functools.partial(np.mean, axis=1), n_cpu=1, **kwargs)
+    for n_cpu in [1, 2]:
+        np.random.seed(1)
+        result = UMC_generic(draw_samples, functools.partial(np.mean, axis=2), n_cpu=n_cpu,
+                             vectorized=True, **kwargs)
+        assert np.allclose(result[0], expected[0])
+        assert np.allclose(result[1], expected[1])
+        assert result[3] == (3,)
+        assert np.array_equal(result[4]["results"], expected[4]["results"])
+
+
+def test_UMC_generic_executor():
+    # an executor can be reused across calls and is not shut down
+    draw_samples = lambda size: np.random.rand(size, 3, 4)
+    evaluate = functools.partial(np.mean, axis=1)
+    with ThreadPoolExecutor(2) as executor:
+        for chunksize in [1, 3]:
+            np.random.seed(1)
+            y, Uy, _, output_shape = UMC_generic(draw_samples, evaluate, runs=95, blocksize=20,
+                                                 runs_init=10, executor=executor,
+                                                 chunksize=chunksize)
+            assert output_shape == (3,)
+    np.random.seed(1)
+    y_expected, Uy_expected, _, _ = UMC_generic(draw_samples, evaluate, runs=95, blocksize=20,
+                                                runs_init=10, n_cpu=1)
+    assert np.allclose(y, y_expected)
+    assert np.allclose(Uy, Uy_expected)
+
+
+def test_UMC_generic_checkpoint(tmp_path):
+    # a resumed simulation gives the same results as an uninterrupted one
+    checkpoint = str(tmp_path / "umc.npz")
+    draw_samples = lambda size: np.random.rand(size, 3, 4)
+    kwargs = dict(runs=95, blocksize=20, runs_init=10, return_samples=True, n_cpu=1,
+                  checkpoint=checkpoint, checkpoint_interval=0)
+
+    def interrupted(sample, calls=[0]):
+        calls[0] += 1
+        if calls[0] > 60:
+            raise KeyboardInterrupt
+        return np.mean(sample, axis=1)
+
+    np.random.seed(1)
+    expected = UMC_generic(draw_samples, functools.partial(np.mean, axis=1), **kwargs)
+    np.random.seed(1)
+    with raises(KeyboardInterrupt):
+        UMC_generic(draw_samples, interrupted, **kwargs)
+    np.random.seed(2)
+    result = UMC_generic(draw_samples, functools.partial(np.mean, axis=1),
+                         resume_from=checkpoint, **kwargs)
+    assert np.array_equal(result[0], expected[0])
+    assert np.array_equal(result[1], expected[1])
+    for h, h_expected in zip(result[2].values(), expected[2].values()):
+        assert np.array_equal(h["bin-counts"], h_expected["bin-counts"])
+    assert np.array_equal(result[4]["results"], expected[4]["results"])
+
+
+def test_UMC_generic_histograms():
+    # the histograms of all columns agree with those of np.histogram column by column
+    Y = np.random.randn(50, 6)
+    Y[:, 2] = 0.5  # all samples on the edges
+    edges = np.linspace(np.min(Y[:10], axis=0), np.max(Y[:10], axis=0), 11)
+    edges[:, 3] = np.linspace(0.0, 1.0, 11)
+    Y[:11, 3] = edges[:, 3]
+    counts = np.array([np.histogram(Y[:, k], bins=edges[:, k])[0] for k in range(6)]).T
+    assert np.array_equal(_histograms(Y, edges), counts)
+
+
+def test_adaptive():
+    # the adaptive procedure stops once the results have stabilized
+    np.random.seed(12345)
+    y, Uy, report = MC(x, sigma_noise, b1, [1.0], Ub, runs=100000, blow=b2, blocksize=2000,
+                       adaptive=True, ndig=1, verbose=False)
+    assert report["converged"]
+    assert report["runs"] < 100000
+    assert report["tolerance"].shape == x.shape
+    assert np.all(report["tolerance"] <= np.sqrt(np.diag(Uy)))
+
+    # the maximum number of runs is not exceeded
+    _, _, report = MC(x, sigma_noise, b1, [1.0], Ub, runs=5000, blow=b2, blocksize=2000,
+                      adaptive=True, ndig=3, verbose=False)
+    assert not report["converged"]
+    assert report["runs"] == 5000
+
+    # sets comprise at least 100 / (1 - credible_interval) runs (GUM-S1 7.9.4)
+    with raises(ValueError):
+        MC(x, sigma_noise, b1, [1.0], Ub, runs=100000, blow=b2, blocksize=500,
+           adaptive=True, verbose=False)
+    with raises(ValueError):
+        MC(x, sigma_noise, b1, [1.0], Ub, runs=1000, blow=b2, adaptive=True, verbose=False)
+
+    # UMC_generic pools consecutive blocks into such sets
+    draw_samples = lambda size: np.random.normal(size=(size, 5))
+    _, _, _, _, report = UMC_generic(draw_samples, np.cumsum, runs=100000, blocksize=500,
+                                     runs_init=10, n_cpu=1, adaptive=True, ndig=1)
+    assert report["converged"]
+    assert report["runs"] < 100000
+    assert report["runs"] >= 4000 and report["runs"] % 2000 == 0
+    with raises(ValueError):
+        UMC_generic(draw_samples, np.cumsum, runs=1000, blocksize=500, runs_init=10,
+                    n_cpu=1, adaptive=True)
+
+
 def test_compare_MC_UMC():
 
     np.random.seed(12345)
@@ -3,10 +3,20 @@ import itertools
 
 import numpy as np
 import scipy
+import scipy.linalg
+import scipy.signal
 import pytest
 
 from PyDynamic.misc.tools import make_semiposdef, trimOrPad
-from PyDynamic.uncertainty.propagate_filter import FIRuncFilter
+from PyDynamic.uncertainty.propagate_filter import (
+    FIRuncFilter,
+    FIRuncFilterPlan,
+    FIRuncFilterStream,
+    FIRuncFilterCovariance,
+    IIRuncFilter,
+    SOSuncFilter,
+    _iir_steady_state_length,
+)
 from PyDynamic.uncertainty.propagate_MonteCarlo import MC
 
 
@@ -187,5 +197,401 @@ def test_FIRuncFilter_MC_uncertainty_comparison(filters, signals, lowpasses):
     )
 
 
-def test_IIRuncFilter():
-    pass
+@pytest.mark.parametrize("filters", valid_filters())
+@pytest.mark.parametrize("lowpasses", valid_lows())
+def test_FIRuncFilter_diag_dense_reference(filters, lowpasses):
+    # Check the banded evaluation for kind="diag" against the dense covariance of
+    # the low-pass filtered noise.
+    theta, Utheta, blow = filters["theta"], filters["Utheta"], lowpasses["blow"]
+    Ntheta = len(theta)
+    y = random_array(np.random.randint(100, 300))
+    sigma_noise = random_nonnegative_array(len(y))
+
+    # dense reference following Leeuw1994, the noise before the first sample is
+    # assumed to be stationary
+    if blow is None:
+        b = np.ones(1)
+        xlow = y
+    else:
+        b = blow
+        xlow = scipy.signal.lfilter(b, 1.0, y, zi=y[0] * scipy.signal.lfilter_zi(b, 1.0))[0]
+    sigma2 = sigma_noise ** 2
+    sigma2_extended = np.append(np.full(Ntheta + len(b) - 2, sigma2[0]), sigma2)
+    M = scipy.linalg.toeplitz(trimOrPad(b, len(sigma2_extended)), np.zeros(len(sigma2_extended)))
+    V = (M * sigma2_extended).dot(M.T)[len(b) - 1 :, len(b) - 1 :]
+    xlow_extended = np.append(np.full(Ntheta - 1, xlow[0]), xlow)
+
+    uy_ref = np.zeros(len(y))
+    for k in range(len(y)):
+        Ulow = V[k : k + Ntheta, k : k + Ntheta]
+        uy_ref[k] = np.flip(theta).dot(Ulow).dot(np.flip(theta))
+        if isinstance(Utheta, np.ndarray):
+            XL = xlow_extended[k : k + Ntheta]
+            uy_ref[k] += np.abs(np.trace(Ulow.dot(np.flip(Utheta))))
+            uy_ref[k] += XL.dot(np.flip(Utheta)).dot(XL)
+    uy_ref = np.sqrt(np.abs(uy_ref))
+
+    _, uy = FIRuncFilter(y, sigma_noise, theta, Utheta, blow=blow, kind="diag")
+    assert np.allclose(uy, uy_ref)
+
+
+@pytest.mark.parametrize("filters", valid_filters())
+@pytest.mark.parametrize("signals", valid_signals())
+@pytest.mark.parametrize("lowpasses", valid_lows())
+def test_FIRuncFilter_methods(filters, signals, lowpasses):
+    # Check that the vectorized evaluation of the Utheta-term matches the loop.
+    y_loop, uy_loop = FIRuncFilter(**filters, **signals, **lowpasses, method="loop")
+    y_eig, uy_eig = FIRuncFilter(**filters, **signals, **lowpasses, method="eig")
+
+    assert np.allclose(y_loop, y_eig)
+    assert np.allclose(uy_loop, uy_eig)
+
+
+@pytest.mark.parametrize("filters", valid_filters())
+@pytest.mark.parametrize("signals", valid_signals())
+@pytest.mark.parametrize("lowpasses", valid_lows())
+def test_FIRuncFilter_conv_methods(filters, signals, lowpasses):
+    # Check that FFT-based convolution matches direct convolution.
+    y_direct, uy_direct = FIRuncFilter(
+        **filters, **signals, **lowpasses, conv_method="direct"
+    )
+    y_fft, uy_fft = FIRuncFilter(**filters, **signals, **lowpasses, conv_method="fft")
+
+    assert np.allclose(y_direct, y_fft)
+    assert np.allclose(uy_direct, uy_fft)
+
+
+@pytest.mark.parametrize("filters", valid_filters())
+@pytest.mark.parametrize("signals", valid_signals())
+@pytest.mark.parametrize("lowpasses", valid_lows())
+def test_FIRuncFilterStream(filters, signals, lowpasses):
+    # Check that chunk-wise filtering yields the same result as one-shot filtering.
+    y_ref, uy_ref = FIRuncFilter(**filters, **signals, **lowpasses)
+
+    stream = FIRuncFilterStream(**filters, **lowpasses, kind=signals["kind"])
+    y = signals["y"]
+    sigma_noise = signals["sigma_noise"]
+    bounds = np.unique(np.r_[0, np.random.randint(1, len(y), size=5), len(y)])
+
+    results = []
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if signals["kind"] == "diag":
+            results.append(stream.filter(y[start:stop], sigma_noise[start:stop]))
+        else:
+            results.append(stream.filter(y[start:stop], sigma_noise))
+
+    assert np.allclose(np.concatenate([r[0] for r in results]), y_ref)
+    assert np.allclose(np.concatenate([r[1] for r in results]), uy_ref)
+
+
+@pytest.mark.parametrize("filters", valid_filters())
+@pytest.mark.parametrize("signals", valid_signals())
+@pytest.mark.parametrize("lowpasses", valid_lows())
+def test_FIRuncFilterPlan(filters, signals, lowpasses):
+    # Check that repeated application of a plan equals FIRuncFilter.
+    plan = FIRuncFilterPlan(
+        **filters, **lowpasses, sigma_noise=signals["sigma_noise"], kind=signals["kind"]
+    )
+    y_ref, uy_ref = FIRuncFilter(**filters, **signals, **lowpasses, shift=3)
+
+    for _ in range(2):
+        y, uy = plan.apply(signals["y"], shift=3)
+        assert np.allclose(y, y_ref)
+        assert np.allclose(uy, uy_ref)
+
+    # a different noise model of the same kind can be given for a single application
+    sigma_noise = 2 * signals["sigma_noise"]
+    _, uy_ref = FIRuncFilter(
+        **filters, y=signals["y"], sigma_noise=sigma_noise, kind=signals["kind"], **lowpasses
+    )
+    _, uy = plan.apply(signals["y"], sigma_noise=sigma_noise)
+    assert np.allclose(uy, uy_ref)
+
+
+@pytest.mark.parametrize("filters", valid_filters())
+@pytest.mark.parametrize("kind", ["float", "diag", "corr"])
+@pytest.mark.parametrize("lowpasses", valid_lows())
+def test_FIRuncFilter_multichannel(filters, kind, lowpasses):
+    # Check that filtering several channels at once equals channel-wise filtering.
+    n_channels, N = 3, np.random.randint(100, 300)
+    y = np.random.randn(n_channels, N)
+    if kind == "float":
+        sigma_noise = np.random.randn()
+    elif kind == "diag":
+        sigma_noise = np.random.random((n_channels, N))
+    else:
+        sigma_noise = np.random.random((n_channels, N // 2))
+
+    x, ux = FIRuncFilter(y, sigma_noise, **filters, **lowpasses, kind=kind, shift=2)
+    assert x.shape == y.shape
+    assert ux.shape == y.shape
+
+    for channel in range(n_channels):
+        if isinstance(sigma_noise, float):
+            channel_noise = sigma_noise
+        else:
+            channel_noise = sigma_noise[channel]
+        x_channel, ux_channel = FIRuncFilter(
+            y[channel], channel_noise, **filters, **lowpasses, kind=kind, shift=2
+        )
+        assert np.allclose(x[channel], x_channel)
+        assert np.allclose(ux[channel], ux_channel)
+
+
+@pytest.mark.parametrize("filters", valid_filters())
+@pytest.mark.parametrize("lowpasses", valid_lows())
+def test_FIRuncFilter_channel_std(filters, lowpasses):
+    # Check that channel-wise standard deviations are accepted as for IIRuncFilter.
+    n_channels, N = 3, np.random.randint(100, 300)
+    y = np.random.randn(n_channels, N)
+    sigma_noise = np.random.random((n_channels, 1))
+
+    x, ux = FIRuncFilter(y, sigma_noise, **filters, **lowpasses, kind="diag")
+    for channel in range(n_channels):
+        x_channel, ux_channel = FIRuncFilter(
+            y[channel], float(sigma_noise[channel, 0]), **filters, **lowpasses
+        )
+        assert np.allclose(x[channel], x_channel)
+        assert np.allclose(ux[channel], ux_channel)
+
+    # a 1D-array of length channels is no shared autocovariance in disguise
+    with pytest.raises(ValueError):
+        FIRuncFilter(y, sigma_noise.ravel(), **filters, **lowpasses, kind="corr")
+
+
+def test_FIRuncFilter_list_input():
+    # signals and noise models may be given as lists
+    x, ux = FIRuncFilter([0.1, 0.2, 0.3, 0.4], 0.1, np.array([0.5, 0.5]))
+    assert np.allclose(x, [0.1, 0.15, 0.25, 0.35])
+    assert np.allclose(ux, 0.1 * np.sqrt(0.5))
+
+    x, ux = FIRuncFilter(
+        [[0.1, 0.2, 0.3, 0.4]] * 2, [[0.1], [0.2]], np.array([0.5, 0.5]), kind="diag"
+    )
+    assert np.allclose(x, [0.1, 0.15, 0.25, 0.35])
+    assert np.allclose(ux, [[0.1 * np.sqrt(0.5)], [0.2 * np.sqrt(0.5)]])
+
+
+@pytest.mark.parametrize("filters", valid_filters())
+@pytest.mark.parametrize("kind", ["float", "diag", "corr"])
+@pytest.mark.parametrize("lowpasses", valid_lows())
+def test_FIRuncFilter_covariance(filters, kind, lowpasses):
+    # Check the structured output covariance against a dense reference.
+    theta, Utheta, blow = filters["theta"], filters["Utheta"], lowpasses["blow"]
+    Ntheta, N, shift = len(theta), np.random.randint(20, 60), 3
+    y = random_array(N)
+    if kind == "float":
+        sigma_noise = np.random.randn()
+    elif kind == "diag":
+        sigma_noise = random_nonnegative_array(N)
+    else:  # autocovariance of a moving average process is positive semidefinite
+        c = random_array(5)
+        sigma_noise = np.correlate(c, c, mode="full")[len(c) - 1 :]
+
+    x, ux, Ux = FIRuncFilter(
+        y, sigma_noise, **filters, **lowpasses, kind=kind, shift=shift, return_cov=True
+    )
+    assert isinstance(Ux, FIRuncFilterCovariance)
+    assert Ux.shape == (N, N)
+
+    # dense covariance of the low-pass filtered noise at the Ntheta - 1 samples
+    # before and the N samples of the signal, stationary before the first sample
+    b = np.ones(1) if blow is None else blow
+    n_ext = N + Ntheta + len(b) - 2
+    if kind == "corr":
+        Vin = scipy.linalg.toeplitz(trimOrPad(sigma_noise, n_ext))
+    else:
+        sigma2 = np.full(N, sigma_noise ** 2)
+        Vin = np.diag(np.append(np.full(n_ext - N, sigma2[0]), sigma2))
+    M = scipy.linalg.toeplitz(trimOrPad(b, n_ext), np.zeros(n_ext))
+    V = M.dot(Vin).dot(M.T)[len(b) - 1 :, len(b) - 1 :]
+    xlow = np.convolve(np.append(np.full(len(b) - 1, y[0]), y), b, mode="valid")
+    xlow_extended = np.append(np.full(Ntheta - 1, xlow[0]), xlow)
+
+    Q = np.outer(theta, theta)
+    if isinstance(Utheta, np.ndarray):
+        Q += Utheta
+    Ux_ref = np.zeros((N, N))
+    for i, j in itertools.product(range(Ntheta), repeat=2):
+        Ux_ref += Q[i, j] * V[Ntheta - 1 - i :, Ntheta - 1 - j :][:N, :N]
+    if isinstance(Utheta, np.ndarray):
+        X = scipy.linalg.hankel(xlow_extended[:N], xlow_extended[N - 1 :])
+        Ux_ref += np.flip(X, axis=1).dot(Utheta).dot(np.flip(X, axis=1).T)
+    Ux_ref = np.roll(Ux_ref, (-shift, -shift), axis=(0, 1))
+
+    assert np.allclose(Ux.todense(), Ux_ref)
+    assert np.allclose(Ux.diag(), ux ** 2)
+    assert np.allclose(Ux.block(5, 15), Ux_ref[5:15, 5:15])
+    v = random_array(N)
+    assert np.allclose(Ux.matvec(v), Ux_ref.dot(v))
+
+    with pytest.raises(ValueError):
+        FIRuncFilter(np.vstack((y, y)), 0.1, **filters, return_cov=True)
+
+
+def valid_iir_filters():
+    valid_iir_filters = []
+    for order in (1, 2, 5):
+        b, a = scipy.signal.butter(order, np.random.uniform(0.1, 0.5))
+        Uab = random_semiposdef_matrix(2 * order + 1) * 1e-6
+        valid_iir_filters.append({"b": b, "a": a, "Uab": Uab})
+
+    return valid_iir_filters
+
+
+@pytest.mark.parametrize("filters", valid_iir_filters())
+@pytest.mark.parametrize("noise", ["float", "array"])
+def test_IIRuncFilter(filters, noise):
+    # Check against the sample-wise state-space recursion of Link and Elster.
+    b, a, Uab = filters["b"], filters["a"], filters["Uab"]
+    x = random_array(np.random.randint(100, 300))
+    if noise == "float":
+        noise = np.random.random()
+        noise_array = np.full(len(x), noise)
+    else:
+        noise = noise_array = random_nonnegative_array(len(x))
+
+    A, bs, c, b0 = scipy.signal.tf2ss(b, a)
+    bs, c, b0 = bs.ravel(), c.ravel(), b0.item()
+    p = len(a) - 1
+    z, dz, P = np.zeros(p), np.zeros((p, p)), np.zeros((p, p))
+    y_ref, Uy_ref = np.zeros(len(x)), np.zeros(len(x))
+    for n in range(len(x)):
+        # derivatives w.r.t. a_1, ..., a_p, b_0 and b_1, ..., b_p
+        phi = np.concatenate((c.dot(dz) - b0 * z, [x[n] - a[1:].dot(z)], z))
+        y_ref[n] = c.dot(z) + b0 * x[n]
+        Uy_ref[n] = phi.dot(Uab).dot(phi) + c.dot(P).dot(c) + b[0] ** 2 * noise_array[n] ** 2
+        P = A.dot(P).dot(A.T) + noise_array[n] ** 2 * np.outer(bs, bs)
+        dz = A.dot(dz)
+        dz[0] -= z
+        z = A.dot(z) + bs * x[n]
+    Uy_ref = np.sqrt(np.abs(Uy_ref))
+
+    y, Uy = IIRuncFilter(x, noise, b, a, Uab)
+    assert np.allclose(y, y_ref)
+    assert np.allclose(Uy, Uy_ref)
+
+    # without uncertainty of the filter the noise is propagated by the impulse
+    # response of the filter
+    h = scipy.signal.lfilter(b, a, np.eye(1, len(x))[0])
+    _, Uy = IIRuncFilter(x, noise, b, a, np.zeros_like(Uab))
+    assert np.allclose(Uy, np.sqrt(np.convolve(noise_array ** 2, h ** 2)[: len(x)]))
+    assert np.isclose(Uy[0], noise_array[0] * abs(b[0]))
+
+
+@pytest.mark.parametrize("filters", valid_iir_filters())
+def test_IIRuncFilter_state(filters):
+    # Check that processing a signal chunk by chunk equals processing it at once.
+    x = random_array(np.random.randint(100, 300))
+    noise = random_nonnegative_array(len(x))
+    y_ref, Uy_ref = IIRuncFilter(x, noise, **filters)
+
+    results = []
+    state = None
+    boundaries = np.sort(np.random.choice(np.arange(1, len(x)), 4, replace=False))
+    for x_chunk, noise_chunk in zip(np.split(x, boundaries), np.split(noise, boundaries)):
+        y, Uy, state = IIRuncFilter(
+            x_chunk, noise_chunk, **filters, state=state, return_state=True
+        )
+        results.append((y, Uy))
+
+    assert np.allclose(np.concatenate([r[0] for r in results]), y_ref)
+    assert np.allclose(np.concatenate([r[1] for r in results]), Uy_ref)
+
+
+@pytest.mark.parametrize("filters", valid_iir_filters())
+def test_IIRuncFilter_steady_state(filters):
+    # Check that truncating the impulse response in steady state does not change
+    # the result, also for piecewise constant noise.
+    x = random_array(2000)
+    for noise in (np.random.random(), np.repeat(random_nonnegative_array(4), 500)):
+        _, Uy_ref = IIRuncFilter(x, noise, **filters)
+        _, Uy = IIRuncFilter(x, noise, **filters, steady_state_tol=1e-12)
+        assert np.allclose(Uy, Uy_ref, rtol=1e-9)
+
+    # the switch-over to the steady state happens, also for filters of high order
+    A, bs, _, _ = scipy.signal.tf2ss(filters["b"], filters["a"])
+    assert _iir_steady_state_length(A, bs.ravel(), len(x), 1e-12) < len(x)
+    A, bs, _, _ = scipy.signal.tf2ss(*scipy.signal.butter(8, 0.2))
+    for tol in (1e-10, 1e-12):
+        assert _iir_steady_state_length(A, bs.ravel(), 200000, tol) < 2000
+    assert _iir_steady_state_length(A, bs.ravel(), 200000) == 200000
+
+
+@pytest.mark.parametrize("order", [2, 5, 12])
+@pytest.mark.parametrize("noise", ["float", "array"])
+def test_SOSuncFilter(order, noise):
+    # Check against sensitivities of the cascade computed by the complex-step method.
+    sos = scipy.signal.butter(order, np.random.uniform(0.1, 0.5), output="sos")
+    n_sections = len(sos)
+    Usos = random_semiposdef_matrix(5 * n_sections) * 1e-8
+    x = random_array(np.random.randint(100, 300))
+    if noise == "float":
+        noise = np.random.random()
+        noise_array = np.full(len(x), noise)
+    else:
+        noise = noise_array = random_nonnegative_array(len(x))
+
+    J = np.zeros((len(x), 5 * n_sections))
+    for k, index in itertools.product(range(n_sections), range(5)):
+        sos_step = sos.astype(complex)
+        sos_step[k, [4, 5, 0, 1, 2][index]] += 1e-20j
+        J[:, 5 * k + index] = scipy.signal.sosfilt(sos_step, x).imag / 1e-20
+    h = scipy.signal.sosfilt(sos, np.eye(1, len(x))[0])
+    Uy_ref = np.sum(J.dot(Usos) * J, axis=1)
+    Uy_ref += np.convolve(noise_array ** 2, h ** 2)[: len(x)]
+
+    y, Uy = SOSuncFilter(x, noise, sos, Usos)
+    assert np.allclose(y, scipy.signal.sosfilt(sos, x))
+    assert np.allclose(Uy, np.sqrt(Uy_ref))
+
+
+@pytest.mark.parametrize("filters", valid_iir_filters())
+@pytest.mark.parametrize("noise_shape", [(), (3, 1), (1, 200), (3, 200)])
+def test_IIRuncFilter_multichannel(filters, noise_shape):
+    # Check that filtering several channels at once equals channel-wise filtering.
+    x = np.random.randn(3, 200)
+    noise = np.random.random(noise_shape)
+    if noise_shape == (1, 200):
+        noise = noise[0]
+    noise_channels = np.broadcast_to(noise, x.shape)
+
+    y, Uy = IIRuncFilter(x, noise, **filters)
+    assert y.shape == x.shape
+    assert Uy.shape == x.shape
+
+    for channel in range(len(x)):
+        y_channel, Uy_channel = IIRuncFilter(
+            x[channel], noise_channels[channel], **filters
+        )
+        assert np.allclose(y[channel], y_channel)
+        assert np.allclose(Uy[channel], Uy_channel)
+
+    # chunks of several channels
+    y1, Uy1, state = IIRuncFilter(
+        x[:, :120], noise_channels[:, :120], **filters, return_state=True
+    )
+    y2, Uy2 = IIRuncFilter(x[:, 120:], noise_channels[:, 120:], **filters, state=state)
+    assert np.allclose(np.hstack((y1, y2)), y)
+    assert np.allclose(np.hstack((Uy1, Uy2)), Uy)
+
+
+@pytest.mark.parametrize("filters", valid_iir_filters())
+def test_IIRuncFilter_ARMA(filters):
+    # Check that ARMA noise equals white noise through the noise-shaping filter.
+    b, a, Uab = filters["b"], filters["a"], filters["Uab"]
+    x = random_array(np.random.randint(100, 300))
+    sigma = np.random.random()
+    phi, theta = [0.5, -0.2], [0.3]
+
+    _, Uy = IIRuncFilter(x, sigma, b, a, Uab, phi=phi, theta=theta)
+    _, Uy_filter = IIRuncFilter(x, 0.0, b, a, Uab)
+    b_noise = np.convolve(b, [1.0] + theta)
+    a_noise = np.convolve(a, [1.0] + [-coefficient for coefficient in phi])
+    Uab_noise = np.zeros((2 * len(a_noise) - 1,) * 2)
+    _, Uy_noise = IIRuncFilter(x, sigma, b_noise, a_noise, Uab_noise)
+    assert np.allclose(Uy ** 2, Uy_filter ** 2 + Uy_noise ** 2)
+
+    # the noise level does not change the result without noise
+    _, Uy = IIRuncFilter(x, 0.0, b, a, Uab, phi=phi, theta=theta)
+    assert np.allclose(Uy, Uy_filter)